@@ -1,6 +1,18 @@
 from __future__ import absolute_import
 __version__ = '0.1.0'
 from .compact_dependencies import *
+from .kaulos_integrators import *
+from .kaulos_tables import *
+from .kaulos_profiling import *
 from .kaulos_engine import *
 from .kaulos_models import *
 from .kaulos import *
+from .kaulos_numpy import *
+from .kaulos_checkpoints import *
+from .kaulos_simulation import *
+from .kaulos_recording import *
+from .kaulos_stimuli import *
+from .kaulos_connectivity import *
+from .kaulos_sweeps import *
+from .kaulos_cache import *
+from .kaulos_resting import *
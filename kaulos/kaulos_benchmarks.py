@@ -0,0 +1,165 @@
+"""Simulation benchmarks for Kaulos circuits.
+
+Run with, e.g.,
+
+    python -m kaulos.kaulos_benchmarks --units 10 100 1000 --timesteps 100 1000 --output results.json
+
+Every record holds the graph build time, the first-call latency, the steady-state steps per second, the component unit steps
+per second and the peak resident set size. Every benchmark runs in a fresh Python process, so that its peak resident set size is
+its own rather than that of the largest benchmark run before it; --in-process runs them all in the calling process instead.
+GPUs are hidden unless --gpu is given.
+"""
+from .compact_dependencies import *
+from .kaulos_engine import KaulosWrapperCell
+from .kaulos_models import IdealIAF, LeakyIAF, HodgkinHuxley, AlphaSynapse, AggregatorDendrite
+from .kaulos_connectivity import Connectivity
+from .kaulos_simulation import build_simulation
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+def _synapse_dendrite(units):
+    components = [AlphaSynapse(component_units = units), AggregatorDendrite(component_units = units)]
+    W = Connectivity(components).connect(0, 'g', 1, 'g').connect(0, 'V_reverse', 1, 'V_reverse')
+    return components, W
+
+# Circuit builders; each returns the components and the connectivity for a population size
+CIRCUITS = OrderedDict([
+    ('IdealIAF', lambda units: ([IdealIAF(component_units = units)], None)),
+    ('LeakyIAF', lambda units: ([LeakyIAF(component_units = units)], None)),
+    ('HodgkinHuxley', lambda units: ([HodgkinHuxley(component_units = units)], None)),
+    ('AlphaSynapse+AggregatorDendrite', _synapse_dendrite),
+])
+
+def peak_rss_mb():
+    """Returns the peak resident set size of the process in megabytes, or None where the resource module is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+def environment():
+    """Returns the versions and the machine the benchmarks ran on.
+    """
+    return OrderedDict([('python', platform.python_version()), ('platform', platform.platform()), ('processor', platform.processor()),
+                        ('keras', keras.__version__), ('backend', K.backend()), ('numpy', np.__version__),
+                        ('tensorflow', getattr(tf, '__version__', None) if K.backend() == 'tensorflow' else None)])
+
+def benchmark_circuit(circuit, units, timesteps, mode = 'loop', batch_size = 1, repeats = 3, seed = 0, config = None):
+    """Builds and simulates one circuit and returns its timings.
+    # Arguments:
+        circuit (str): Name of the circuit in CIRCUITS.
+        units (int): Number of units of every component.
+        timesteps (int): Number of simulated steps.
+        mode (str): Simulation mode, 'loop' or 'unroll'.
+        batch_size (int): Number of samples simulated together.
+        repeats (int): Number of steady-state calls; the fastest one is reported.
+        seed (int): Seed of the random inputs.
+        config (tf.ConfigProto): Optional configuration of the TensorFlow session of the benchmark.
+    """
+    K.clear_session()
+    if config is not None:
+        K.set_session(tf.Session(config=config))
+    start = time.time()
+    components, W = CIRCUITS[circuit](units)
+    cell = KaulosWrapperCell(components, W = W)
+    model = build_simulation(cell, (timesteps, cell.units), mode = mode, return_state = False)
+    build_seconds = time.time() - start
+    inputs = np.random.RandomState(seed).rand(batch_size, timesteps, cell.units).astype(K.floatx())
+    start = time.time()
+    model.predict(inputs, batch_size = batch_size)
+    first_call_seconds = time.time() - start
+    seconds = []
+    for k in range(repeats):
+        start = time.time()
+        model.predict(inputs, batch_size = batch_size)
+        seconds.append(time.time() - start)
+    steps_per_second = timesteps * batch_size / min(seconds)
+    component_units = sum(i._COMPONENT_UNITS for i in components)
+    return OrderedDict([('circuit', circuit), ('units', units), ('component_units', component_units), ('timesteps', timesteps),
+                        ('batch_size', batch_size), ('mode', mode), ('build_seconds', build_seconds),
+                        ('first_call_seconds', first_call_seconds), ('steps_per_second', steps_per_second),
+                        ('neuron_steps_per_second', steps_per_second * component_units), ('peak_rss_mb', peak_rss_mb())])
+
+def benchmark_subprocess(circuit, units, timesteps, mode = 'loop', batch_size = 1, repeats = 3, config = None):
+    """Runs benchmark_circuit in a fresh Python process, so that the peak resident set size of the record belongs to this benchmark only.
+    The arguments are those of benchmark_circuit.
+    """
+    handle, path = tempfile.mkstemp(prefix='kaulos_benchmark_', suffix='.json')
+    os.close(handle)
+    try:
+        command = [sys.executable, '-m', 'kaulos.kaulos_benchmarks', '--in-process', '--circuits', circuit, '--units', str(units),
+                   '--timesteps', str(timesteps), '--mode', mode, '--batch-size', str(batch_size), '--repeats', str(repeats), '--output', path]
+        if config is not None:
+            command += ['--config', config.SerializeToString().hex()]
+        else:
+            command.append('--gpu')
+        # The cells print their sizes, so the record is passed through a file rather than stdout
+        subprocess.check_call(command, stdout=subprocess.DEVNULL)
+        with open(path) as f:
+            return json.load(f, object_pairs_hook=OrderedDict)['results'][0]
+    finally:
+        os.remove(path)
+
+def run_benchmarks(circuits = None, units = (10, 100, 1000), timesteps = (100, 1000), mode = 'loop', batch_size = 1, repeats = 3, config = None,
+                   isolate = True):
+    """Benchmarks every combination of circuit, population size and sequence length.
+    # Arguments:
+        circuits (list of str): Names of circuits in CIRCUITS; all of them by default.
+        units (list of ints): Population sizes.
+        timesteps (list of ints): Sequence lengths.
+        mode (str): Simulation mode, 'loop' or 'unroll'.
+        batch_size (int): Number of samples simulated together.
+        repeats (int): Number of steady-state calls per benchmark.
+        config (tf.ConfigProto): Optional configuration of the TensorFlow sessions, e.g. to hide GPUs.
+        isolate (bool): Whether to run every benchmark in its own process with benchmark_subprocess. In a single process the peak resident set
+            size is a high-water mark, so every record after the largest benchmark reports the peak of that benchmark.
+    # Returns:
+        OrderedDict with the environment and one result record per benchmark.
+    """
+    circuits = list(CIRCUITS) if circuits is None else list(circuits)
+    results = []
+    for circuit in circuits:
+        for n in units:
+            for T in timesteps:
+                benchmark = benchmark_subprocess if isolate else benchmark_circuit
+                results.append(benchmark(circuit, n, T, mode = mode, batch_size = batch_size, repeats = repeats, config = config))
+    return OrderedDict([('environment', environment()), ('results', results)])
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Benchmarks the simulation of Kaulos circuits.')
+    parser.add_argument('--circuits', nargs='+', choices=list(CIRCUITS), default=None)
+    parser.add_argument('--units', nargs='+', type=int, default=[10, 100, 1000])
+    parser.add_argument('--timesteps', nargs='+', type=int, default=[100, 1000])
+    parser.add_argument('--mode', choices=['loop', 'unroll'], default='loop')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--gpu', action='store_true', help='Allow the benchmarks to use GPUs.')
+    parser.add_argument('--config', default=None, help='Hex-encoded serialized tf.ConfigProto of the sessions; overrides --gpu.')
+    parser.add_argument('--in-process', action='store_true', help='Run all benchmarks in this process; their peak memory is then cumulative.')
+    parser.add_argument('--output', default=None, help='JSON file for the results; printed to stdout by default.')
+    args = parser.parse_args(argv)
+    config = None
+    if args.config is not None:
+        config = tf.ConfigProto.FromString(bytes.fromhex(args.config))
+    elif not args.gpu and K.backend() == 'tensorflow':
+        config = tf.ConfigProto(device_count={'GPU': 0})
+    report = run_benchmarks(args.circuits, args.units, args.timesteps, args.mode, args.batch_size, args.repeats, config, isolate = not args.in_process)
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == '__main__':
+    main()
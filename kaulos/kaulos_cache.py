@@ -0,0 +1,162 @@
+from .compact_dependencies import *
+from .kaulos_engine import KaulosWrapperCell
+from .kaulos_simulation import build_simulation
+from .kaulos_profiling import KaulosProfiler
+import hashlib
+
+def _hash_value(h, value, seen = None):
+    """Feeds a configuration value into a hash; arrays, containers and plain objects are hashed by content.
+    Layers are hashed by class only, since the components of the circuit are fingerprinted separately.
+    # Arguments:
+        h (hashlib object): The hash.
+        value (any): The value.
+        seen (set of ints): Ids of the objects already hashed, so that cyclic references terminate.
+    """
+    seen = set() if seen is None else seen
+    if isinstance(value, np.ndarray) or np.isscalar(value) and isinstance(value, np.generic):
+        value = np.ascontiguousarray(value)
+        h.update(('array' + str(value.dtype) + str(value.shape)).encode())
+        h.update(value.tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(('seq' + str(len(value))).encode())
+        for i in value:
+            _hash_value(h, i, seen)
+    elif isinstance(value, dict):
+        h.update(('dict' + str(len(value))).encode())
+        for a in sorted(value, key=str):
+            _hash_value(h, a, seen)
+            _hash_value(h, value[a], seen)
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        h.update((type(value).__name__ + repr(value)).encode())
+    elif hasattr(value, 'tocoo'):
+        value = value.tocoo()
+        _hash_value(h, (value.shape, value.row, value.col, value.data), seen)
+    elif isinstance(value, KaulosProfiler):
+        # A profiler accumulates its report, so it is identified by the instance
+        h.update(('profiler' + str(id(value))).encode())
+    elif isinstance(value, Layer) or id(value) in seen:
+        h.update(('ref' + type(value).__name__).encode())
+    elif hasattr(value, '__dict__'):
+        seen.add(id(value))
+        h.update((type(value).__module__ + '.' + type(value).__name__).encode())
+        _hash_value(h, vars(value), seen)
+    else:
+        h.update(repr(value).encode())
+
+def circuit_fingerprint(components, **config):
+    """Returns a hex digest that identifies a circuit and the way it is simulated.
+    It covers the model classes, unit counts, integrators, rate tables, dt, the names of the trainable params and the current values of all params
+    of every component, and every configuration value, such as the connectivity, stimuli, sequence length and simulation mode.
+    # Arguments:
+        components (list of _KaulosModel): The components of the circuit.
+        config (dict): Cell arguments and simulation settings.
+    """
+    h = hashlib.sha1()
+    for i in components:
+        trainable = sorted(a for a, b in i.lpu_attributes.params_trainable.items() if b is True)
+        values = i.get_param_values()
+        _hash_value(h, [type(i).__module__ + '.' + type(i).__name__, i._COMPONENT_UNITS, i.integrator, i.rate_table_step, trainable,
+                        list(values.items())])
+    _hash_value(h, config)
+    return h.hexdigest()
+
+class CachedCircuit(object):
+    """A built cell and its simulation model, with the predict function already compiled.
+    # Attributes:
+        key (str): The fingerprint of the circuit.
+        cell (KaulosWrapperCell): The circuit cell.
+        model (Model): The simulation model, as returned by build_simulation.
+    """
+    def __init__(self, key, cell, model):
+        self.key = key
+        self.cell = cell
+        self.model = model
+    def predict(self, inputs, **kwargs):
+        return self.model.predict(inputs, **kwargs)
+
+class CircuitCache(object):
+    """Least recently used cache of built circuits, so that repeated simulations of an unchanged circuit skip graph construction and compilation.
+    Circuits are keyed by circuit_fingerprint, so new but identical component instances hit the cache. A hit returns the circuit built from the
+    component instances of the first lookup; the instances passed to later lookups are not used, so changing their params afterwards has no effect
+    on the cached circuit. Change the params of a cached circuit with circuit.cell.set_param_values, which also reaches fused populations. Evicted circuits are dropped from the cache, but with TensorFlow their ops stay in the graph until the session is cleared.
+    # Attributes:
+        max_size (int): Maximum number of cached circuits.
+        circuits (OrderedDict of CachedCircuits): The cached circuits by key, least recently used first.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that built a circuit.
+    """
+    def __init__(self, max_size = 8):
+        """Initialization function for the CircuitCache class.
+        # Arguments:
+            max_size (int): Maximum number of cached circuits.
+        """
+        if max_size < 1:
+            raise ValueError('The cache needs room for at least one circuit.')
+        self.max_size = int(max_size)
+        self.circuits = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def __len__(self):
+        return len(self.circuits)
+    def key(self, components, input_shape, mode = 'loop', return_sequences = True, return_state = True, batch_size = None, timesteps = None, **cell_kwargs):
+        """Returns the fingerprint of a circuit and its simulation settings; the arguments are those of get.
+        """
+        return circuit_fingerprint(components, input_shape = tuple(input_shape), mode = mode, return_sequences = return_sequences,
+                                   return_state = return_state, batch_size = batch_size, timesteps = timesteps, cell_kwargs = cell_kwargs)
+    def get(self, components, input_shape, mode = 'loop', return_sequences = True, return_state = True, batch_size = None, timesteps = None, **cell_kwargs):
+        """Returns the cached circuit of the components and settings, and builds and caches it on a miss.
+        On a hit the circuit holds the component instances of the lookup that built it, not the given ones; see circuit.cell.components.
+        # Arguments:
+            components (list of _KaulosModel): The components of the circuit.
+            input_shape (tuple of ints): Shape of the inputs, as in build_simulation.
+            mode (str): 'loop' or 'unroll'.
+            return_sequences (bool): Whether to return the outputs of every step or only the last one.
+            return_state (bool): Whether to also return the final states.
+            batch_size (int): Optional fixed batch size.
+            timesteps (int): Optional number of steps to run from a constant input.
+            cell_kwargs (dictionary): Further arguments of KaulosWrapperCell, e.g. W, stimuli or substeps.
+        """
+        key = self.key(components, input_shape, mode, return_sequences, return_state, batch_size, timesteps, **cell_kwargs)
+        if key in self.circuits:
+            self.hits += 1
+            circuit = self.circuits.pop(key)
+            self.circuits[key] = circuit
+            return circuit
+        self.misses += 1
+        cell = KaulosWrapperCell(components, **cell_kwargs)
+        model = build_simulation(cell, input_shape, mode = mode, return_sequences = return_sequences, return_state = return_state,
+                                 batch_size = batch_size, timesteps = timesteps)
+        model._make_predict_function()
+        circuit = CachedCircuit(key, cell, model)
+        self.circuits[key] = circuit
+        while len(self.circuits) > self.max_size:
+            self.circuits.popitem(last=False)
+        return circuit
+    def simulate(self, components, inputs, mode = 'loop', return_sequences = True, return_state = True, **cell_kwargs):
+        """Simulates inputs with the cached circuit of the components, which is only built on a miss.
+        In 'loop' mode the circuit is shared by all sequence lengths; in 'unroll' mode every sequence length has its own circuit.
+        # Arguments:
+            components (list of _KaulosModel): The components of the circuit.
+            inputs (ndarray or list of ndarrays): Inputs of shape (batch_size, timesteps, units), or [inputs, sweep values] for cells that sweep params.
+            mode (str): 'loop' or 'unroll'.
+            return_sequences (bool): Whether to return the outputs of every step or only the last one.
+            return_state (bool): Whether to also return the final states.
+            cell_kwargs (dictionary): Further arguments of KaulosWrapperCell.
+        """
+        x = inputs[0] if isinstance(inputs, list) else inputs
+        input_shape = (None,) + tuple(np.shape(x)[2:]) if mode == 'loop' else tuple(np.shape(x)[1:])
+        return self.get(components, input_shape, mode, return_sequences, return_state, **cell_kwargs).predict(inputs)
+    def invalidate(self, components = None, input_shape = None, mode = 'loop', return_sequences = True, return_state = True, batch_size = None,
+                   timesteps = None, **cell_kwargs):
+        """Drops the circuit of the components and settings from the cache, or every circuit when no components are given.
+        # Arguments:
+            components (list of _KaulosModel): The components of the circuit to drop; the other arguments are those of get.
+        # Returns:
+            The number of dropped circuits.
+        """
+        if components is None:
+            dropped = len(self.circuits)
+            self.circuits.clear()
+            return dropped
+        key = self.key(components, input_shape, mode, return_sequences, return_state, batch_size, timesteps, **cell_kwargs)
+        return int(self.circuits.pop(key, None) is not None)
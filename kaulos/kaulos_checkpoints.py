@@ -0,0 +1,148 @@
+from .compact_dependencies import *
+import json
+import os
+import shutil
+import tempfile
+
+CHECKPOINT_FILE = 'checkpoint.json'
+TEMPORARY_PREFIX = '.tmp_step_'
+
+def _cell_state_sizes(cell):
+    """Returns the state sizes of a cell as a list.
+    # Arguments:
+        cell (KaulosWrapperCell): The circuit cell.
+    """
+    if hasattr(cell.state_size, '__len__'):
+        return [int(i) for i in cell.state_size]
+    return [int(cell.state_size)]
+
+def _replace(path, write):
+    """Writes a file under a temporary name and then moves it into place, so that a crash never leaves a partial file behind.
+    # Arguments:
+        path (str): Path of the file.
+        write (function): Writes the contents to an open binary file.
+    """
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        write(f)
+    os.replace(temporary, path)
+
+class Checkpoint(object):
+    """The states, params and step counter of a circuit, as saved by save_checkpoint.
+    # Attributes:
+        states (list of ndarrays): The alters, inters and bookkeeping states of the cell, each of shape (batch_size, state_size);
+            memory maps of the checkpoint files unless loaded with mmap_mode = None.
+        steps (int): Number of steps simulated when the checkpoint was saved.
+        layer_names (list of str): Names of the layers of the cell.
+        params (OrderedDict): Param values of every layer, as returned by get_param_values, by layer name.
+    """
+    def __init__(self, states, steps, layer_names, params):
+        self.states = states
+        self.steps = steps
+        self.layer_names = layer_names
+        self.params = params
+    @property
+    def batch_size(self):
+        return self.states[0].shape[0]
+    def initial_state(self, batch_size = None):
+        """Returns the states as initial states of a simulation.
+        # Arguments:
+            batch_size (int): Optional batch size; a checkpoint of one sample is broadcast without copies, e.g. to warm-start many runs from one equilibrated state.
+        """
+        if batch_size is None or batch_size == self.batch_size:
+            return list(self.states)
+        if self.batch_size != 1:
+            raise ValueError('A checkpoint of ' + str(self.batch_size) + ' samples cannot seed a batch of ' + str(batch_size) + '.')
+        return [np.broadcast_to(i, (batch_size,) + i.shape[1:]) for i in self.states]
+
+def _snapshots(directory):
+    """Returns the snapshots of a checkpoint directory listed in its index, oldest first.
+    # Arguments:
+        directory (str): Directory of the checkpoint.
+    """
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return list(json.load(f)['snapshots'])
+
+def save_checkpoint(directory, cell, states, steps = 0, keep = 1):
+    """Saves the states, param values and step counter of a circuit; the states go to one .npy file each, so that they can be memory mapped.
+    Every save writes a complete snapshot into a temporary directory and renames it to step_<steps>. Only then is the index file of the checkpoint
+    atomically switched to the new snapshot, so an interrupted save leaves the index on the previous, consistent snapshot.
+    The temporary directories left behind by interrupted saves are removed by the next save.
+    # Arguments:
+        directory (str): Directory of the checkpoint; created if needed.
+        cell (KaulosWrapperCell): The simulated circuit cell.
+        states (list of ndarrays): The states of the cell, e.g. StreamingSimulator.states or the final states of build_simulation.
+        steps (int): Number of steps simulated so far.
+        keep (int): Number of most recent snapshots to keep on disk.
+    """
+    sizes = _cell_state_sizes(cell)
+    states = [np.asarray(i) for i in states]
+    if [i.shape[-1] for i in states] != sizes:
+        raise ValueError('The states have sizes ' + str([i.shape[-1] for i in states]) + ' but the cell has state sizes ' + str(sizes) + '.')
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for stale in os.listdir(directory):
+        if stale.startswith(TEMPORARY_PREFIX):
+            shutil.rmtree(os.path.join(directory, stale), ignore_errors=True)
+    snapshot = tempfile.mkdtemp(prefix=TEMPORARY_PREFIX, dir=directory)
+    for k, state in enumerate(states):
+        np.save(os.path.join(snapshot, 'state_' + str(k) + '.npy'), state)
+    params = OrderedDict()
+    for name, layer in zip(cell.layer_names, cell.layers):
+        values = layer.get_param_values()
+        np.savez(os.path.join(snapshot, 'params_' + name + '.npz'), **dict((a, np.asarray(b)) for a, b in values.items()))
+        params[name] = list(values.keys())
+    index = OrderedDict([('steps', int(steps)), ('state_sizes', sizes), ('layer_names', list(cell.layer_names)), ('params', params)])
+    with open(os.path.join(snapshot, CHECKPOINT_FILE), 'w') as f:
+        json.dump(index, f, indent=2)
+    name = 'step_' + str(int(steps))
+    k = 0
+    while os.path.exists(os.path.join(directory, name)):
+        k += 1
+        name = 'step_' + str(int(steps)) + '_' + str(k)
+    os.rename(snapshot, os.path.join(directory, name))
+    history = _snapshots(directory) + [name]
+    _replace(os.path.join(directory, CHECKPOINT_FILE), lambda f: f.write(json.dumps(OrderedDict([('snapshots', history[-max(1, keep):])]), indent=2).encode()))
+    for old in history[:-max(1, keep)]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+def load_checkpoint(directory, mmap_mode = 'r'):
+    """Loads the latest snapshot of a checkpoint saved by save_checkpoint.
+    # Arguments:
+        directory (str): Directory of the checkpoint.
+        mmap_mode (str): Memory map mode of the states, as in np.load; None reads them into memory.
+    """
+    snapshots = _snapshots(directory)
+    if len(snapshots) == 0:
+        raise ValueError('There is no checkpoint in ' + str(directory) + '.')
+    snapshot = os.path.join(directory, snapshots[-1])
+    with open(os.path.join(snapshot, CHECKPOINT_FILE)) as f:
+        index = json.load(f, object_pairs_hook=OrderedDict)
+    states = [np.load(os.path.join(snapshot, 'state_' + str(k) + '.npy'), mmap_mode=mmap_mode) for k in range(len(index['state_sizes']))]
+    params = OrderedDict()
+    for name, names in index['params'].items():
+        with np.load(os.path.join(snapshot, 'params_' + name + '.npz')) as values:
+            params[name] = OrderedDict((a, float(values[a]) if a == 'dt' else values[a]) for a in names)
+    return Checkpoint(states, index['steps'], index['layer_names'], params)
+
+def restore_checkpoint(directory, cell, mmap_mode = 'r', restore_params = True):
+    """Loads a checkpoint of a circuit and writes its param values back into the layers of the cell.
+    Params that are not packed into weights take effect when the cell is built, so restore before building the simulation.
+    # Arguments:
+        directory (str): Directory of the checkpoint.
+        cell (KaulosWrapperCell): A cell of the same circuit as the one that was saved.
+        mmap_mode (str): Memory map mode of the states, as in np.load.
+        restore_params (bool): Whether to restore the param values.
+    # Returns:
+        The Checkpoint, whose initial_state seeds build_simulation or StreamingSimulator.
+    """
+    checkpoint = load_checkpoint(directory, mmap_mode = mmap_mode)
+    if list(checkpoint.layer_names) != list(cell.layer_names) or [i.shape[-1] for i in checkpoint.states] != _cell_state_sizes(cell):
+        raise ValueError('The checkpoint in ' + str(directory) + ' was saved from a different circuit.')
+    if restore_params:
+        for name, layer in zip(cell.layer_names, cell.layers):
+            layer.set_param_values(checkpoint.params[name])
+    return checkpoint
@@ -0,0 +1,180 @@
+from .compact_dependencies import *
+
+def coo_connectivity(W, shape):
+    """Converts a connectivity specification into coalesced COO arrays; delayed connections of a Connectivity are left out, see delayed_connectivity.
+    # Arguments:
+        W (Connectivity, sparse matrix, tuple or ndarray): A Connectivity, a scipy.sparse matrix, a (rows, cols, weights) tuple or a dense array.
+            Entry (i, j) routes output column i of the previous step to input column j.
+        shape (tuple of ints): The expected shape, (output_size, units).
+    # Returns:
+        rows (ndarray of ints): Output columns of the connections.
+        cols (ndarray of ints): Input columns of the connections.
+        weights (ndarray of floats): Weights of the connections.
+    """
+    if isinstance(W, Connectivity):
+        immediate = W.delays == 0
+        rows, cols, weights = W.rows[immediate], W.cols[immediate], W.weights[immediate]
+    elif hasattr(W, 'tocoo'):
+        W = W.tocoo()
+        rows, cols, weights = W.row, W.col, W.data
+    elif isinstance(W, tuple):
+        rows, cols, weights = W
+    else:
+        W = np.asarray(W)
+        rows, cols = np.nonzero(W)
+        weights = W[rows, cols]
+    rows = np.asarray(rows, dtype='int64')
+    cols = np.asarray(cols, dtype='int64')
+    weights = np.broadcast_to(np.asarray(weights, dtype='float32'), rows.shape)
+    if len(rows) > 0 and (rows.max() >= shape[0] or cols.max() >= shape[1] or rows.min() < 0 or cols.min() < 0):
+        raise ValueError('The connectivity does not fit a circuit with ' + str(shape[0]) + ' outputs and ' + str(shape[1]) + ' inputs.')
+    # Sum duplicate connections and sort them by input column
+    keys, inverse = np.unique(cols * shape[0] + rows, return_inverse=True)
+    weights = np.bincount(inverse, weights=weights, minlength=len(keys)).astype('float32')
+    return (keys % shape[0]).astype('int64'), (keys // shape[0]).astype('int64'), weights
+
+def delayed_connectivity(W):
+    """Returns the connections of a Connectivity that have a delay, or None if there are none.
+    # Arguments:
+        W (any): A connectivity specification; only a Connectivity can have delays.
+    # Returns:
+        rows, cols, weights, delays (ndarrays): The delayed connections.
+    """
+    if not isinstance(W, Connectivity) or not np.any(W.delays > 0):
+        return None
+    delayed = W.delays > 0
+    return W.rows[delayed], W.cols[delayed], W.weights[delayed], W.delays[delayed]
+
+class Connectivity(object):
+    """Sparse connectivity builder that routes the alters of components to the accesses of other components.
+    Connections are stored as COO arrays over the output columns and input columns of a KaulosWrapperCell built from the same components.
+    # Attributes:
+        components (list of _KaulosModel): The components of the circuit, in the order given to the cell.
+        rows (ndarray of ints): Output columns of the connections.
+        cols (ndarray of ints): Input columns of the connections.
+        weights (ndarray of floats): Weights of the connections.
+        delays (ndarray of ints): Delays of the connections, in steps.
+    """
+    def __init__(self, components):
+        """Initialization function for the Connectivity class.
+        # Arguments:
+            components (list of _KaulosModel): The components of the circuit, in the order given to the cell.
+        """
+        self.components = components
+        self.output_offsets = np.cumsum([0] + [i._COMPONENT_UNITS * len(i.lpu_attributes.alters) for i in components])
+        self.input_offsets = np.cumsum([0] + [i.units for i in components])
+        self.rows = np.zeros((0,), dtype='int64')
+        self.cols = np.zeros((0,), dtype='int64')
+        self.weights = np.zeros((0,), dtype='float32')
+        self.delays = np.zeros((0,), dtype='int64')
+    @property
+    def shape(self):
+        return (int(self.output_offsets[-1]), int(self.input_offsets[-1]))
+    def output_column(self, component, variable, unit):
+        """Returns the output columns of an alter of a component.
+        # Arguments:
+            component (int): Index of the component.
+            variable (str): Name of the alter.
+            unit (int or ndarray of ints): Units of the component.
+        """
+        i = self.components[component]
+        slot = list(i.lpu_attributes.alters).index(variable)
+        return self.output_offsets[component] + slot * i._COMPONENT_UNITS + np.asarray(unit)
+    def input_column(self, component, access, unit):
+        """Returns the input columns of an access of a component.
+        # Arguments:
+            component (int): Index of the component.
+            access (str): Name of the access.
+            unit (int or ndarray of ints): Units of the component.
+        """
+        i = self.components[component]
+        slot = list(i.lpu_attributes.accesses).index(access)
+        return self.input_offsets[component] + slot * i._COMPONENT_UNITS + np.asarray(unit)
+    def connect(self, pre, variable, post, access, weight = 1.0, pre_units = None, post_units = None, delay = 0):
+        """Routes an alter of one component to an access of another; the routed value is added to the access at the next step.
+        # Arguments:
+            pre (int): Index of the presynaptic component.
+            variable (str): Name of the alter of the presynaptic component, e.g. 'spike'.
+            post (int): Index of the postsynaptic component.
+            access (str): Name of the access of the postsynaptic component, e.g. 'spike'.
+            weight (float or ndarray): Weight of every connection.
+            pre_units (ndarray of ints): Units of the presynaptic component; all of them, one-to-one, by default.
+            post_units (ndarray of ints): Units of the postsynaptic component, paired with pre_units; all of them by default.
+            delay (int or ndarray of ints): Additional delay of every connection in steps, served from a ring buffer of recent outputs.
+        """
+        if pre_units is None:
+            pre_units = np.arange(self.components[pre]._COMPONENT_UNITS)
+        if post_units is None:
+            post_units = np.arange(self.components[post]._COMPONENT_UNITS)
+        pre_units, post_units = np.broadcast_arrays(np.asarray(pre_units), np.asarray(post_units))
+        rows = self.output_column(pre, variable, pre_units).ravel()
+        cols = self.input_column(post, access, post_units).ravel()
+        weights = np.broadcast_to(np.asarray(weight, dtype='float32'), pre_units.shape).ravel()
+        delays = np.broadcast_to(np.asarray(delay, dtype='int64'), pre_units.shape).ravel()
+        if np.any(delays < 0):
+            raise ValueError('Delays cannot be negative.')
+        self.rows = np.concatenate([self.rows, rows])
+        self.cols = np.concatenate([self.cols, cols])
+        self.weights = np.concatenate([self.weights, weights])
+        self.delays = np.concatenate([self.delays, delays])
+        return self
+    def todense(self):
+        """Returns the connectivity as a dense (output_size, units) array.
+        """
+        dense = np.zeros(self.shape, dtype='float32')
+        np.add.at(dense, (self.rows, self.cols), self.weights)
+        return dense
+
+class SynapseAggregator(object):
+    """Population-level replacement for AggregatorDendrite that sums g * (V - V_reverse) over many synapses onto their postsynaptic units.
+    Uses sum_s g_s * (V - V_reverse_s) = V * sum_s g_s - sum_s g_s * V_reverse_s, so each step needs a single segment sum over the synapses.
+    Like the connectivity, it reads the outputs of the previous step and adds the current to an access of the postsynaptic component.
+    # Attributes:
+        post_units (ndarray of ints): Postsynaptic unit of every synapse unit.
+        weight (float): Factor applied to the current, e.g. -1.0 for the inward-positive convention.
+    """
+    def __init__(self, components, synapse, post, post_units, access = 'I', voltage = 'V', conductance = 'g', reverse = 'V_reverse', weight = 1.0):
+        """Initialization function for the SynapseAggregator class.
+        # Arguments:
+            components (list of _KaulosModel): The components of the circuit, in the order given to the cell.
+            synapse (int): Index of the synapse component, e.g. an AlphaSynapse population.
+            post (int): Index of the postsynaptic component.
+            post_units (ndarray of ints): Postsynaptic unit of every synapse unit.
+            access (str): Access of the postsynaptic component that receives the current.
+            voltage (str): Alter of the postsynaptic component that holds its voltage.
+            conductance (str): Alter of the synapse component that holds its conductance.
+            reverse (str): Alter of the synapse component that holds its reversal potential.
+            weight (float): Factor applied to the current.
+        """
+        connectivity = Connectivity(components)
+        synapse_units = np.arange(components[synapse]._COMPONENT_UNITS)
+        self.post_units = np.asarray(post_units, dtype='int32')
+        if self.post_units.shape != synapse_units.shape:
+            raise ValueError('post_units needs one entry per unit of the synapse component.')
+        self.n_post = components[post]._COMPONENT_UNITS
+        self.units = connectivity.shape[1]
+        self.weight = weight
+        self.conductance_columns = connectivity.output_column(synapse, conductance, synapse_units).astype('int32')
+        self.reverse_columns = connectivity.output_column(synapse, reverse, synapse_units).astype('int32')
+        self.voltage_begin = int(connectivity.output_column(post, voltage, 0))
+        self.input_begin = int(connectivity.input_column(post, access, 0))
+        self.segment_ids = np.concatenate([self.post_units, self.post_units + self.n_post])
+        self.index_tensors = None
+    def build(self):
+        """Creates the index tensors of the aggregation once, so that the steps do not add copies of them to the graph; called by the cell in build.
+        """
+        self.index_tensors = [K.constant(i, dtype='int32') for i in (self.conductance_columns, self.reverse_columns, self.segment_ids)]
+    def aggregate(self, output):
+        """Computes the aggregated current in the input layout of the cell.
+        # Arguments:
+            output (tensor): Output of the previous step, of shape (batch_size, output_size).
+        """
+        if self.index_tensors is None:
+            self.build()
+        conductance_columns, reverse_columns, segment_ids = self.index_tensors
+        g = tf.gather(output, conductance_columns, axis=1)
+        reverse = tf.gather(output, reverse_columns, axis=1)
+        sums = tf.transpose(tf.unsorted_segment_sum(tf.transpose(K.concatenate([g, g * reverse], axis=-1)), segment_ids, 2 * self.n_post))
+        V = output[:, self.voltage_begin:self.voltage_begin + self.n_post]
+        I = self.weight * (sums[:, :self.n_post] * V - sums[:, self.n_post:])
+        return tf.pad(I, [[0, 0], [self.input_begin, self.units - self.input_begin - self.n_post]])
@@ -1,26 +1,73 @@
 from .compact_dependencies import *
+from .kaulos_connectivity import coo_connectivity, delayed_connectivity
+from .kaulos_integrators import integrate_step, linear_propagator
+from .kaulos_tables import RateTable, interpolate_table
+from .kaulos_profiling import profile_scope
 
 _BACKEND = keras.backend.backend()
 
+def _unit_values(value, units):
+    """Converts a scalar, array or Keras variable into a float32 array of shape (1, units).
+    # Arguments:
+        value (float, ndarray or variable): The value to convert.
+        units (int): Number of units in the component.
+    """
+    if not isinstance(value, (int, float, list, tuple, np.ndarray, np.number)):
+        value = K.get_value(value)
+    value = np.asarray(value, dtype='float32')
+    return np.array(np.broadcast_to(np.reshape(value, (1, -1)), (1, units)))
+
+def _constant_value(value, units):
+    """Converts an initial value into something Constant accepts; scalars stay floats and arrays are given one entry per unit.
+    # Arguments:
+        value (float or ndarray): The initial value.
+        units (int): Number of units in the component.
+    """
+    if np.ndim(value) == 0:
+        return float(value)
+    return _unit_values(value, units)
+
 class _KaulosModel(Layer):
     """Kaulos Model Layer class. This class implements the step function for a specific component type in the circuit.
     # Attributes:
         lpu_attributes (dict): The data structure that holds params, alters (output state variables) and inters (hidden state variables).
         units (int): Number of variables in the model.
         state_size (int): Size of the state variable matrix.
+        integrator (str): Integrator applied to the derivatives declared by the model, see integrate; None runs the hand-written kaulos_step.
+        integrators (tuple of str): The integrators the model supports; 'euler', 'rk4' and 'exponential_euler' need derivatives, 'exact' needs linear_system.
+        rate_table (RateTable): Tabulated rate_functions of the model, or None when they are evaluated analytically.
+        rate_table_values (tensor): Constant tensor of the rates of rate_table, shared by every step.
+        rate_table_range (tuple of floats): Voltage range tabulated for the rate_functions of the model.
     """
-    def __init__(self, component_units = 1, **kwargs):
+    integrator = None
+    integrators = ()
+    rate_table = None
+    rate_table_values = None
+    rate_table_range = None
+    propagator_weight = None
+    def __init__(self, component_units = 1, integrator = None, rate_table_step = None, **kwargs):
         """Initialization function for the _KaulosModel class.
         # Arguments:
             component_units (int): Number of units in the Layer.
+            integrator (str): One of the integrators of the model, e.g. 'rk4' for models that declare derivatives or 'exact' for linear models;
+                the class default is used if None.
+            rate_table_step (float): Voltage spacing of the lookup table for models that declare rate_functions; they are evaluated analytically if None.
             kwargs (dict of OrderedDicts) : Contains the list of trainable parameters, parameters, state variables and initial values.
         """
         self._COMPONENT_UNITS = component_units
+        if integrator is not None:
+            if integrator not in self.integrators:
+                raise ValueError('Unknown integrator ' + str(integrator) + ' for ' + type(self).__name__ + '; expected one of ' + ', '.join(self.integrators) + '.')
+            self.integrator = integrator
+        if rate_table_step is not None and self.rate_table_range is None:
+            raise ValueError(type(self).__name__ + ' does not declare rate functions to tabulate.')
+        self.rate_table_step = rate_table_step
         self.lpu_attributes = LPU_Attr()
-        self.lpu_attributes.params = self.params
-        self.lpu_attributes.alters = self.alters
-        self.lpu_attributes.inters = self.inters
-        self.lpu_attributes.accesses = self.accesses
+        self.packed_weights = OrderedDict()
+        self.lpu_attributes.params = OrderedDict(self.params)
+        self.lpu_attributes.alters = OrderedDict(self.alters)
+        self.lpu_attributes.inters = OrderedDict(self.inters)
+        self.lpu_attributes.accesses = list(self.accesses)
         self.lpu_attributes.accesses_tensors = OrderedDict()
         if 'dt' not in self.lpu_attributes.params.keys():
             self.lpu_attributes.params['dt'] = 1e-3
@@ -32,9 +79,15 @@ class _KaulosModel(Layer):
         self.call_outs = []
         self.units = max(int(self._COMPONENT_UNITS * len(self.accesses)), int(self._COMPONENT_UNITS * len(self.alters)))
         if len(self.inters)>0:
-            self.state_size = [self.units, int(self._COMPONENT_UNITS * len(self.inters))]
+            self.state_size = [int(self._COMPONENT_UNITS * len(self.alters)), int(self._COMPONENT_UNITS * len(self.inters))]
         else:
-            self.state_size = [self.units]
+            self.state_size = [int(self._COMPONENT_UNITS * len(self.alters))]
+        # Split sizes used to partition the inputs and states of a step
+        self.alters_splits = [self._COMPONENT_UNITS] * len(self.alters)
+        self.inters_splits = [self._COMPONENT_UNITS] * len(self.inters)
+        self.accesses_splits = [self._COMPONENT_UNITS] * len(self.accesses)
+        if self.units > self._COMPONENT_UNITS * len(self.accesses):
+            self.accesses_splits.append(self.units - self._COMPONENT_UNITS * len(self.accesses))
         super(_KaulosModel, self).__init__()
         self.update_lpu_attrs(**kwargs)
         # self.add_param_weights(**kwargs)
@@ -47,6 +100,8 @@ class _KaulosModel(Layer):
             return self.lpu_attributes.params[key]
         if key in self.lpu_attributes.params_trainable:
             return self.lpu_attributes.params_trainable[key]
+        if key in self.lpu_attributes.derived:
+            return self.lpu_attributes.derived[key]
         if key in self.lpu_attributes.alters:
             return self.lpu_attributes.alters[key]
         if key in self.lpu_attributes.inters:
@@ -62,6 +117,10 @@ class _KaulosModel(Layer):
         """
         for a in self.lpu_attributes.alters:
             self.call_outs.append(self.lpu_attributes.alters[a])
+        self.check_hooks()
+        self.build_propagator()
+        self.build_rate_table()
+        self.lpu_attributes.derived = self.derived_params()
 
         super(_KaulosModel, self).build(input_shape)
     def compute_output_shape(self, input_shape):
@@ -80,38 +139,25 @@ class _KaulosModel(Layer):
                 if a in self.lpu_attributes.params.keys():
                     self.lpu_attributes.params_trainable[a] = True
         if self._COMPONENT_UNITS>1:
-            for a,b in kwargs.items():
-                if a == 'dt':
-                    self.lpu_attributes.params[a] = b
+            # Parameters live in a few packed (n, units) weights; every name is a static row view
+            if 'dt' in kwargs:
+                self.lpu_attributes.params['dt'] = kwargs['dt']
+            self.lpu_attributes.params_trainable['dt'] = False
+            values = OrderedDict()
+            for a, b in list(self.lpu_attributes.params.items()) + list(self.lpu_attributes.alters.items()) + list(self.lpu_attributes.inters.items()):
+                if a != 'dt':
+                    values[a] = _unit_values(kwargs.get(a, b), self._COMPONENT_UNITS)[0]
+            for a in self.lpu_attributes.params:
+                if a not in self.lpu_attributes.params_trainable:
                     self.lpu_attributes.params_trainable[a] = False
-                elif a in self.lpu_attributes.params.keys():
-                    if a in kwargs['params_trainable']:
-                        self.lpu_attributes.params[a] = self.add_weight(name=a,
-                                                      shape=(1,self._COMPONENT_UNITS),
-                                                      initializer=Constant(value=float(self.lpu_attributes.params[a])),
-                                                      trainable=self.lpu_attributes.params_trainable[a])
-                    else:
-                        if a not in self.lpu_attributes.params_trainable.keys():
-                            self.lpu_attributes.params_trainable[a] = False
-                        self.lpu_attributes.params[a] = self.add_weight(name=a,
-                                                      shape=(1,self._COMPONENT_UNITS),
-                                                      initializer=Constant(value=float(b)),
-                                                      trainable=self.lpu_attributes.params_trainable[a])
-                        self.lpu_attributes.params_trainable[a] = False
-                if a in self.lpu_attributes.alters.keys():
-                    if a not in self.lpu_attributes.params_trainable.keys():
-                        self.lpu_attributes.params_trainable[a] = False
-                    self.lpu_attributes.alters[a] = self.add_weight(name=a,
-                                                  shape=(1,self._COMPONENT_UNITS),
-                                                  initializer=Constant(value=float(b)),
-                                                  trainable=self.lpu_attributes.params_trainable[a])
-                if a in self.lpu_attributes.inters.keys():
-                    if a not in self.lpu_attributes.params_trainable.keys():
-                        self.lpu_attributes.params_trainable[a] = False
-                    self.lpu_attributes.inters[a] = self.add_weight(name=a,
-                                                  shape=(1,self._COMPONENT_UNITS),
-                                                  initializer=Constant(value=float(b)),
-                                                  trainable=self.lpu_attributes.params_trainable[a])
+            names = [a for a in self.lpu_attributes.params if a != 'dt']
+            self.lpu_attributes.params.update(self.pack_weights('params', [a for a in names if not self.lpu_attributes.params_trainable[a]], values, False))
+            self.lpu_attributes.params.update(self.pack_weights('params_trainable', [a for a in names if self.lpu_attributes.params_trainable[a]], values, True))
+            # Initial values are per-unit arrays; acquire replaces them by the incoming states, so they need no weight
+            for a in self.lpu_attributes.alters:
+                self.lpu_attributes.alters[a] = values[a][None, :]
+            for a in self.lpu_attributes.inters:
+                self.lpu_attributes.inters[a] = values[a][None, :]
         else:
             for a,b in kwargs.items():
                 if a in self.lpu_attributes.params.keys():
@@ -124,6 +170,60 @@ class _KaulosModel(Layer):
                 if a == 'dt':
                     self.lpu_attributes.params[a] = b
                     self.lpu_attributes.params_trainable[a] = False
+    def pack_weights(self, name, names, values, trainable):
+        """Creates one (len(names), units) weight initialized from per-unit arrays, and returns a (1, units) view of every row.
+        # Arguments:
+            name (str): Name of the weight.
+            names (list of str): Names of the packed variables, one row each.
+            values (OrderedDict of ndarrays): Per-unit initial value of every variable.
+            trainable (bool): Whether the weight is trainable.
+        """
+        if len(names) == 0:
+            return OrderedDict()
+        weight = self.add_weight(name=name,
+                                 shape=(len(names), self._COMPONENT_UNITS),
+                                 initializer=Constant(value=np.stack([values[a] for a in names])),
+                                 trainable=trainable)
+        self.packed_weights[name] = (weight, names)
+        return OrderedDict((a, weight[k:k+1, :]) for k, a in enumerate(names))
+    def get_param_values(self):
+        """Returns the current parameter values of the model as per-unit arrays; dt is returned as a float.
+        """
+        packed = OrderedDict()
+        for name, (weight, names) in self.packed_weights.items():
+            rows = K.get_value(weight)
+            packed.update((a, rows[k:k+1].astype('float32')) for k, a in enumerate(names))
+        values = OrderedDict()
+        for a, b in self.lpu_attributes.params.items():
+            if a == 'dt':
+                values[a] = float(b)
+            elif a in packed:
+                values[a] = packed[a]
+            else:
+                values[a] = _unit_values(b, self._COMPONENT_UNITS)
+        return values
+    def set_param_values(self, values):
+        """Writes parameter values into the packed weights, with one read and one write per weight.
+        Params that are not packed, such as dt and the params of single-unit models, are replaced and take effect when the model is built again.
+        An exact propagator is recomputed from the new values. Derived params of packed params follow the weights, and rate tables only depend on V.
+        # Arguments:
+            values (dict): Per-unit arrays or scalars by parameter name.
+        """
+        for name, (weight, names) in self.packed_weights.items():
+            if any(a in values for a in names):
+                rows = K.get_value(weight)
+                for k, a in enumerate(names):
+                    if a in values:
+                        rows[k] = _unit_values(values[a], self._COMPONENT_UNITS)[0]
+                K.set_value(weight, rows)
+        packed = [a for name, (weight, names) in self.packed_weights.items() for a in names]
+        for a, b in values.items():
+            if a not in self.lpu_attributes.params:
+                raise ValueError(type(self).__name__ + ' has no parameter ' + str(a) + '.')
+            if a not in packed:
+                self.lpu_attributes.params[a] = b
+        if self.propagator_weight is not None:
+            self.build_propagator()
     def add_param_weights(self, **kwargs):
         """Deprecated function for adding trainable parameters.
         # Arguments:
@@ -161,40 +261,14 @@ class _KaulosModel(Layer):
                 #print(a, i)
                 self.lpu_attributes.accesses_tensors[a] = I[:,i:i+self._COMPONENT_UNITS]
                 i+=1
-        elif _BACKEND == "tensorflow":
-            i = 0
-            for a in self.lpu_attributes.alters:
-                #print(a, i)
-                self.lpu_attributes.alters[a] = S[0][:,i:i+self._COMPONENT_UNITS]
-                i+=self._COMPONENT_UNITS
-            i = 0
-            for a in self.lpu_attributes.inters:
-                #print(a, i)
-                self.lpu_attributes.inters[a] = S[1][:,i:i+self._COMPONENT_UNITS]
-                i+=self._COMPONENT_UNITS
-            i = 0
-            for a in self.lpu_attributes.accesses_tensors:
-                #print(a, i)
-                self.lpu_attributes.accesses_tensors[a] = I[:,i:i+self._COMPONENT_UNITS]
-                i+=self._COMPONENT_UNITS
-        else: # Idea for TF splits
-            all_vars = tf.split(S[0], [1 for i in range(len(self.lpu_attributes.alters.keys()) + len(self.lpu_attributes.inters.keys()))], self._COMPONENT_UNITS)
-            all_ins = tf.split(S[0], [1 for i in range(max(int(len(self.accesses)), int(len(self.alters))))], self._COMPONENT_UNITS)
-            i = 0
-            for a in self.lpu_attributes.alters:
-                #print(a, i)
-                self.lpu_attributes.alters[a] = all_vars[i]
-                i+=1
-            i = 0
-            for a in self.lpu_attributes.inters:
-                #print(a, i)
-                self.lpu_attributes.inters[a] = all_vars[i]
-                i+=1
-            i = 0
-            for a in self.lpu_attributes.accesses_tensors:
-                #print(a, i)
-                self.lpu_attributes.accesses_tensors[a] = all_ins[i]
-                i+=1
+        else:
+            self.lpu_attributes.alters.update(zip(self.lpu_attributes.alters, _split_columns(S[0], self.alters_splits)))
+            if len(self.inters)>0:
+                self.lpu_attributes.inters.update(zip(self.lpu_attributes.inters, _split_columns(S[1], self.inters_splits)))
+            self.lpu_attributes.accesses_tensors.update(zip(self.lpu_attributes.accesses_tensors, _split_columns(I, self.accesses_splits)))
+        # Drop the values written by the previous kaulos_step so that the getters read the acquired tensors
+        for a in list(self.lpu_attributes.alters) + list(self.lpu_attributes.inters) + list(self.lpu_attributes.accesses_tensors):
+            self.__dict__.pop(a, None)
         self.Ot = S[0]
         if len(self.inters)>0:
             self.St = S[1]
@@ -224,7 +298,7 @@ class _KaulosModel(Layer):
                 #self.lpu_attributes.alters[a]
             for a in self.lpu_attributes.alters:
                 #print('Added to output from alters: ', a, i, self.lpu_attributes.alters[a])
-                outs_list.append(vars(self)[a])
+                outs_list.append(getattr(self, a))
                 #outs_list.append(self.lpu_attributes.alters[a])
                 #if len(self.lpu_attributes.alters)>1:
                 #    self.Ot = T.set_subtensor(self.Ot[:,i:i+1], vars(self)[a])
@@ -232,34 +306,167 @@ class _KaulosModel(Layer):
                 #    self.Ot = T.set_subtensor(self.Ot[:,:], vars(self)[a])
                 i += 1
             #zero = tf.constant(1., dtype=tf.int32, name="kaulos_concat_zero")
-            self.Ot = tf.concat(outs_list,-1)
+            self.Ot = _concat_columns(outs_list)
             state_list = []
             if len(self.inters)>0:
                 i = 0
                 for a in self.lpu_attributes.inters:
                     #print('Added to output from inters: ', a, i)
                     #self.St = T.set_subtensor(self.St[:,i:i+1], vars(self)[a])
-                    state_list.append(vars(self)[a])
+                    state_list.append(getattr(self, a))
                     i += 1
-                self.St = tf.concat(state_list,-1)
+                self.St = _concat_columns(state_list)
             state_list = []
     def kaulos_step():
         """Placeholder step update function for the model; gets overridden by the model.
         """
         pass
-    def call(self, I, S):
+    def check_hooks(self):
+        """Raises a ValueError when the integrator or rate table of the model needs a placeholder function that the model does not override.
+        """
+        required = []
+        if self.integrator in ('euler', 'rk4', 'exponential_euler'):
+            required.append(('derivatives', "the '" + self.integrator + "' integrator"))
+        if self.integrator == 'exact':
+            required.append(('linear_system', "the 'exact' integrator"))
+        if self.rate_table_range is not None or self.rate_table_step is not None:
+            required.append(('rate_functions', 'its rate table'))
+        for a, reason in required:
+            if getattr(type(self), a) is getattr(_KaulosModel, a):
+                raise ValueError(type(self).__name__ + ' does not define ' + a + ', which ' + reason + ' needs.')
+    def derivatives(self, x):
+        """Placeholder derivative function for models integrated with integrate; gets overridden by the model.
+        # Arguments:
+            x (OrderedDict of tensors): Current values of the integrated variables; params and accesses are read from self.
+        # Returns:
+            OrderedDict with the derivative of every variable, either a tensor or a pair (A, B) meaning dx/dt = A - B * x.
+            Only the pairs are integrated exactly by exponential Euler.
+        """
+        pass
+    def derived_params(self):
+        """Placeholder for the derived parameters of the model, e.g. dt / C; overridden by models that declare them.
+        They are evaluated once in build and read by kaulos_step like params. Derived parameters of trainable params are
+        tensors of the weights, so they follow the weights without being recomputed at every step.
+        # Returns:
+            OrderedDict of expressions of params only.
+        """
+        return OrderedDict()
+    def linear_system(self, params):
+        """Placeholder linear system for models with exact propagators; gets overridden by the model.
+        # Arguments:
+            params (OrderedDict): Parameter values from get_param_values.
+        # Returns:
+            A (ndarray): System matrices of shape (units, n, n).
+            B (ndarray): Input matrices of shape (units, n, m), for dx/dt = A x + B u.
+        """
+        pass
+    def build_propagator(self):
+        """Computes the exact propagator of linear_system from the current params and dt, when the integrator is 'exact'.
+        The coefficients live in a non-trainable weight, so that calling this again after set_param_values also updates a built step.
+        """
+        if self.integrator != 'exact':
+            return
+        if any(b is True for b in self.lpu_attributes.params_trainable.values()):
+            raise ValueError('Exact propagators are computed from fixed params; ' + type(self).__name__ + ' has trainable params.')
+        params = self.get_param_values()
+        Phi, Gamma = linear_propagator(*self.linear_system(params), dt = params['dt'])
+        n_x, n_u = Phi.shape[1], Gamma.shape[2]
+        coefficients = np.concatenate([np.reshape(np.transpose(Phi, (1, 2, 0)), (n_x * n_x, -1)),
+                                       np.reshape(np.transpose(Gamma, (1, 2, 0)), (n_x * n_u, -1))]).astype('float32')
+        if self.propagator_weight is None:
+            self.propagator_weight = self.add_weight(name='propagator', shape=coefficients.shape,
+                                                     initializer=Constant(value=coefficients), trainable=False)
+        else:
+            K.set_value(self.propagator_weight, coefficients)
+        # Per-unit coefficients of shape (1, units), so that propagate is a few elementwise products
+        rows = lambda c: ([[c[i*n_x + j:i*n_x + j + 1] for j in range(n_x)] for i in range(n_x)],
+                          [[c[n_x*n_x + i*n_u + k:n_x*n_x + i*n_u + k + 1] for k in range(n_u)] for i in range(n_x)])
+        self.propagator = rows(self.propagator_weight)
+        self.propagator_values = rows(coefficients)
+    def propagate(self, x, u):
+        """Advances a linear system by one step with the exact propagator.
+        # Arguments:
+            x (list of tensors): Current values of the state variables.
+            u (list of tensors): Inputs, held constant over the step.
+        """
+        Phi, Gamma = self.propagator
+        new_x = []
+        for i in range(len(x)):
+            value = 0.0
+            for j in range(len(x)):
+                value = value + Phi[i][j] * x[j]
+            for k in range(len(u)):
+                value = value + Gamma[i][k] * u[k]
+            new_x.append(value)
+        return new_x
+    def rate_functions(self, V):
+        """Placeholder voltage-dependent rate functions; gets overridden by models that declare rate_table_range.
+        They may only depend on V, so that they can be tabulated.
+        # Arguments:
+            V (tensor): Voltages.
+        # Returns:
+            OrderedDict of rate tensors.
+        """
+        pass
+    def build_rate_table(self):
+        """Tabulates rate_functions over rate_table_range once, when a rate_table_step is set, and creates the constant tensor the steps gather from.
+        """
+        if self.rate_table_step is None:
+            return
+        self.check_hooks()
+        from .kaulos_numpy import rebind_step
+        rate_functions = rebind_step(type(self).rate_functions)
+        v_min, v_max = self.rate_table_range
+        self.rate_table = RateTable(lambda V: rate_functions(self, V), v_min, v_max, self.rate_table_step)
+        self.rate_table_values = K.constant(self.rate_table.values)
+    def rates(self, V):
+        """Returns the rate_functions at V, interpolated from the rate table if there is one.
+        # Arguments:
+            V (tensor): Voltages.
+        """
+        if self.rate_table is None:
+            return self.rate_functions(V)
+        return interpolate_table(self.rate_table, V, self.rate_table_values)
+    def integrate(self, names):
+        """Advances the named variables by one step of dt with the integrator of the model, and assigns the new values.
+        # Arguments:
+            names (list of str): The integrated variables, in the order given to derivatives.
+        """
+        if getattr(type(self), 'derivatives', None) is _KaulosModel.derivatives:
+            raise ValueError(type(self).__name__ + " does not define derivatives, which the '" + str(self.integrator) + "' integrator needs.")
+        x = OrderedDict((a, getattr(self, a)) for a in names)
+        for a, b in integrate_step(self.integrator, self.derivatives, x, self.dt).items():
+            setattr(self, a, b)
+    def call(self, I, S, substeps = 1, reduce = 'last', profiler = None, name = None):
         """Wraps acquire, kaulos_step and call into one; from the Keras model specification format.
         # Arguments:
             I (tensor): Input tensor.
             S (tensor): State tensor.
+            substeps (int): Number of times kaulos_step is run between acquire and distribute, with the inputs held constant.
+            reduce (str): How the alters of the substeps are combined into the output; 'last', 'mean', 'sum' or 'max'.
+                The returned states always hold the alters of the last substep.
+            profiler (KaulosProfiler): Optional profiler that scopes the acquire, step and distribute phases.
+            name (str): Name of the component in the profiler report.
         """
-        self.acquire(I, S)
-        self.kaulos_step()
-        self.distribute()
+        with profile_scope(profiler, name, 'acquire'):
+            self.acquire(I, S)
+        output = None
+        for k in range(substeps):
+            with profile_scope(profiler, name, 'step'):
+                self.kaulos_step()
+                if reduce != 'last':
+                    step_output = _concat_columns([getattr(self, a) for a in self.lpu_attributes.alters])
+                    output = step_output if output is None else _reduce_substeps(reduce, output, step_output)
+        with profile_scope(profiler, name, 'distribute'):
+            self.distribute()
+        if reduce == 'mean':
+            output = output / float(substeps)
+        elif reduce == 'last':
+            output = self.Ot
         if len(self.inters)>0:
-            return self.Ot, [self.Ot, self.St]
+            return output, [self.Ot, self.St]
         else:
-            return self.Ot, [self.Ot]
+            return output, [self.Ot]
 
 
 class LPU_Attr():
@@ -269,19 +476,173 @@ class LPU_Attr():
         self.accesses = []
         self.params = OrderedDict()
         self.params_trainable = OrderedDict()
+        self.derived = OrderedDict()
         self.alters = OrderedDict()
         self.inters = OrderedDict()
 
 
 
+def fuse_components(layers, separate = ()):
+    """Merges components of the same model class into single populations with one unit per original component unit.
+    Components are grouped by class, dt, trainable parameters, integrator and rate table; their parameters become per-unit vectors of the population.
+    # Arguments:
+        layers (list of _KaulosModel): The components of the circuit.
+        separate (list of ints): Indices of components that are kept out of the populations, e.g. those with swept parameters.
+    # Returns:
+        populations (list of _KaulosModel): One component per group, in order of first appearance.
+        groups (list of lists of ints): Indices of the original components merged into each population.
+    """
+    keys = []
+    groups = []
+    for ii, i in enumerate(layers):
+        trainable = tuple(sorted(a for a, b in i.lpu_attributes.params_trainable.items() if b is True))
+        key = (type(i), float(i.lpu_attributes.params['dt']), trainable, i.integrator, i.rate_table_step, ii if ii in separate else None)
+        if key in keys:
+            groups[keys.index(key)].append(ii)
+        else:
+            keys.append(key)
+            groups.append([ii])
+    populations = []
+    for key, group in zip(keys, groups):
+        if len(group) == 1:
+            populations.append(layers[group[0]])
+            continue
+        model_class, dt, trainable, integrator, rate_table_step, separate_index = key
+        values = [layers[ii].get_param_values() for ii in group]
+        kwargs = OrderedDict()
+        for a in values[0]:
+            if a != 'dt':
+                kwargs[a] = np.concatenate([v[a] for v in values], axis=-1)
+        component_units = sum(layers[ii]._COMPONENT_UNITS for ii in group)
+        populations.append(model_class(component_units = component_units, integrator = integrator, rate_table_step = rate_table_step, dt = dt, params_trainable = list(trainable), **kwargs))
+    return populations, groups
+
+def _fused_index(layers, groups, sizes):
+    """Computes, for every column of the fused layout, the column of the original layout it comes from.
+    # Arguments:
+        layers (list of _KaulosModel): The original components of the circuit.
+        groups (list of lists of ints): Indices of the original components merged into each population.
+        sizes (function): Returns the number of variable slots of a component, each slot being _COMPONENT_UNITS wide.
+    """
+    offsets = np.cumsum([0] + [sizes(i) * i._COMPONENT_UNITS for i in layers])
+    index = []
+    for group in groups:
+        for slot in range(sizes(layers[group[0]])):
+            for ii in group:
+                component_units = layers[ii]._COMPONENT_UNITS
+                begin = offsets[ii] + slot * component_units
+                index.extend(range(begin, begin + component_units))
+    return np.array(index, dtype='int32')
+
+def _split_columns(x, sizes):
+    """Splits a 2D tensor into consecutive column blocks with a single op.
+    # Arguments:
+        x (tensor): Tensor of shape (batch_size, columns).
+        sizes (list of ints): Widths of the blocks.
+    """
+    if len(sizes) == 1:
+        return [x]
+    if _BACKEND == 'theano':
+        offsets = np.cumsum([0] + list(sizes))
+        return [x[:, offsets[i]:offsets[i+1]] for i in range(len(sizes))]
+    return tf.split(x, sizes, axis=-1)
+
+def _concat_columns(tensors):
+    """Concatenates a list of 2D tensors along the columns with a single op.
+    # Arguments:
+        tensors (list of tensors): The tensors to concatenate.
+    """
+    if len(tensors) == 1:
+        return tensors[0]
+    return K.concatenate(tensors, axis=-1)
+
+def _reduce_substeps(reduce, output, step_output):
+    """Combines the alters of a substep with those of the previous substeps.
+    # Arguments:
+        reduce (str): 'mean', 'sum' or 'max'; 'mean' is summed here and divided at the end.
+        output (tensor): The combined alters of the previous substeps.
+        step_output (tensor): The alters of the substep.
+    """
+    if reduce in ('mean', 'sum'):
+        return output + step_output
+    if reduce == 'max':
+        return K.maximum(output, step_output)
+    raise ValueError('Unknown substep reduction: ' + str(reduce))
+
+def _gather_columns(x, index):
+    """Gathers the columns of a 2D tensor.
+    # Arguments:
+        x (tensor): Tensor of shape (batch_size, columns).
+        index (tensor or ndarray of ints): Columns to gather.
+    """
+    if _BACKEND == 'theano':
+        return x[:, index]
+    return tf.gather(x, index, axis=1)
+
 class KaulosWrapperCell(keras.layers.Layer):
     """Kaulos Cell Layer class. This class turns circuit into a cell for Keras RNNs.
     # Attributes:
         lpu_attributes (dict): The data structure that holds params, alters (output state variables) and inters (hidden state variables).
         units (int): Number of variables in the model.
         state_size (int): Size of the state variable matrix.
+        components (list of _KaulosModel): The components given to the cell.
+        layers (list of _KaulosModel): The simulated layers; with fusion these are new populations in place of the components.
+        component_slices (list of tuples): (layer index, first unit, end unit) of every component within the layers.
     """
-    def __init__(self, layers, W = None, **kwargs):
+    def __init__(self, layers, W = None, fuse = True, stimuli = None, dt = None, sparse = True, aggregators = None, substeps = 1, substep_reduce = 'last', sweep = None, profiler = None, **kwargs):
+        """Initialization function for the KaulosWrapperCell class.
+        # Arguments:
+            layers (list of _KaulosModel): The components of the circuit.
+            W (Connectivity, sparse matrix, tuple or ndarray): Connectivity of shape (output_size, units); entry (i, j) adds output i of the previous step to input j.
+                See kaulos_connectivity.coo_connectivity for the accepted formats.
+            fuse (bool): Whether to merge components of the same model class into vectorized populations. The populations are new layers, so the
+                weights, trainable params and propagators of the merged components are not simulated; read and write their params with
+                get_param_values and set_param_values of the cell, which forward them to the populations, and train the weights of cell.layers.
+            stimuli (list of stimuli): Stimuli from kaulos_stimuli that are evaluated from the step index and added to the inputs.
+            dt (float): Duration of a step of the cell for evaluating the stimuli; defaults to the dt of the first component times substeps.
+            sparse (bool): Whether to route the connectivity with a sparse matmul; a dense matmul is used otherwise.
+            aggregators (list of SynapseAggregator): Synapse-to-dendrite aggregations applied to the outputs of the previous step.
+            substeps (int): Number of integration steps of the components per step of the cell. The inputs, connectivity and stimuli are held
+                constant during the substeps, and only one output is emitted per step of the cell.
+            substep_reduce (str): How the alters of the substeps form the output; 'last', 'mean', 'sum' or 'max' (e.g. to keep spikes).
+            sweep (list of tuples): (component index, param name) pairs whose values are given per sample. The cell then takes a constant
+                of shape (batch_size, sweep_size), e.g. RNN(cell)(x, constants = [p]), that holds one column per unit of every swept pair; see sweep_columns.
+            profiler (KaulosProfiler): Optional profiler; every component phase and the routing phases of the cell are then built in named scopes.
+        """
+        if substep_reduce not in ('last', 'mean', 'sum', 'max'):
+            raise ValueError('Unknown substep reduction: ' + str(substep_reduce))
+        self.substeps = int(substeps)
+        self.substep_reduce = substep_reduce
+        self.profiler = profiler
+        self.components = layers
+        self.sweep = [] if sweep is None else [tuple(i) for i in sweep]
+        for component, name in self.sweep:
+            if name == 'dt' or name not in layers[component].lpu_attributes.params:
+                raise ValueError(type(layers[component]).__name__ + ' has no sweepable parameter ' + str(name) + '.')
+            if layers[component].integrator == 'exact':
+                raise ValueError('Exact propagators are computed from fixed params, so the params of component ' + str(component) + ' cannot be swept.')
+        self.sweep_offsets = np.cumsum([0] + [layers[component]._COMPONENT_UNITS for component, name in self.sweep])
+        self.sweep_size = int(self.sweep_offsets[-1])
+        self.fused = False
+        self.component_slices = [(ii, 0, i._COMPONENT_UNITS) for ii, i in enumerate(layers)]
+        if fuse:
+            fused_layers, groups = fuse_components(layers, separate = [component for component, name in self.sweep])
+            if len(fused_layers) < len(layers):
+                for jj, group in enumerate(groups):
+                    begin = 0
+                    for ii in group:
+                        self.component_slices[ii] = (jj, begin, begin + layers[ii]._COMPONENT_UNITS)
+                        begin += layers[ii]._COMPONENT_UNITS
+                self.fused = True
+                self.input_index = _fused_index(layers, groups, lambda i: i.units // i._COMPONENT_UNITS)
+                self.output_index = _fused_index(layers, groups, lambda i: len(i.lpu_attributes.alters))
+                self.inters_index = _fused_index(layers, groups, lambda i: len(i.lpu_attributes.inters))
+                self.output_inverse = np.argsort(self.output_index).astype('int32')
+                self.inters_inverse = np.argsort(self.inters_index).astype('int32')
+                layers = fused_layers
+        # Layers whose params are replaced by the sweep constant in every step
+        self.sweep_targets = [(self.component_slices[component][0], name, int(self.sweep_offsets[k]), int(self.sweep_offsets[k + 1]))
+                              for k, (component, name) in enumerate(self.sweep)]
         self.units = 0
         self.unit_sizes = []
         self.state_size = [0, 0]
@@ -301,13 +662,43 @@ class KaulosWrapperCell(keras.layers.Layer):
             self.state_sizes.append(i.state_size)
         if self.state_size[1]==0:
             self.state_size = [self.state_size[0]]
+        # Number of states that hold the alters and inters of the components
+        self.core_states = len(self.state_size)
+        self.output_size = self.state_size[0]
+        self.W = W
+        self.sparse = sparse
+        self.aggregators = [] if aggregators is None else list(aggregators)
+        self.delayed = None
+        if W is not None:
+            self.connectivity = coo_connectivity(W, (self.output_size, self.units))
+            self.delayed = delayed_connectivity(W)
+        self.stimuli = [] if stimuli is None else list(stimuli)
+        if dt is None:
+            dt = float(self.components[0].lpu_attributes.params['dt']) * self.substeps
+        self.dt = dt
+        if (len(self.stimuli)>0 or len(self.aggregators)>0 or self.delayed is not None) and _BACKEND != 'tensorflow':
+            raise ValueError('Stimuli, synapse aggregators and delays require the TensorFlow backend.')
+        # Step counter used to evaluate the stimuli and to move the head of the delay ring buffer;
+        # an int32 state, since a float32 counter stops incrementing after 2^24 steps
+        self.counter = len(self.stimuli)>0 or self.delayed is not None
+        self.state_dtypes = [K.floatx()] * len(self.state_size)
+        if self.counter:
+            self.state_size.append(1)
+            self.state_dtypes.append('int32')
+        if self.delayed is not None:
+            # Ring buffer of shape (batch_size, delay_length, len(delay_sources)), holding the recent values of the delayed outputs
+            rows, cols, weights, delays = self.delayed
+            self.delay_sources, self.delay_slots = np.unique(rows, return_inverse=True)
+            self.delay_length = int(delays.max()) + 1
+            self.state_size.append(self.delay_length * len(self.delay_sources))
+            self.state_dtypes.append(K.floatx())
         if len(self.state_size) == 1:
             self.state_size = self.state_size[0]
+        self.layer_names = [str(ii) + '_' + type(i).__name__ for ii, i in enumerate(self.layers)]
         print("Units: " + str(self.units))
         print("State Size: " + str(self.state_size))
         print("Unit Size per Layer: " + str(self.unit_sizes))
         print("State Size per Layer: " + str(self.state_sizes))
-        self.W = W
         super(KaulosWrapperCell, self).__init__(**kwargs)
     def build(self, input_shape):
         """Builds the model using the given input_shape; from the Keras model specification.
@@ -317,107 +708,239 @@ class KaulosWrapperCell(keras.layers.Layer):
         for i in self.layers:
             i.build(input_shape)
             self.trainable_weights += i.trainable_weights
-        #self.kernel = self.add_weight(name='kernel',
-        #                              shape=(self.units, self.units),
-        #                              initializer='identity',
-        #                              trainable=False)
-        #if self.W is not None:
-        #    self.set_weights([self.W])
-        #self.built = True
+        # Offset tables used to partition the inputs and states in every step
+        self.output_sizes = [i.state_size[0] for i in self.layers]
+        self.inters_splits = [j for j in self.state_ind_len if j > 0]
+        # Index and weight tensors of the routing, created once so that the steps do not add copies of them to the graph
+        if self.fused:
+            self.fused_indices = [K.constant(i, dtype='int32') for i in (self.input_index, self.output_index, self.inters_index, self.output_inverse, self.inters_inverse)]
+        if len(self.stimuli)>0:
+            self.stimulus_columns = K.constant(np.concatenate([i.columns for i in self.stimuli]), dtype='int32')
+        if self.delayed is not None:
+            rows, cols, weights, delays = self.delayed
+            self.delay_tensors = (K.constant(self.delay_sources, dtype='int32'), K.constant(cols, dtype='int32'), K.constant(weights),
+                                  K.constant(delays, dtype='int32'), K.constant(self.delay_slots, dtype='int32'))
+        for i in self.aggregators:
+            i.build()
+        if self.W is not None:
+            rows, cols, weights = self.connectivity
+            if self.sparse and _BACKEND == 'tensorflow':
+                # Transposed kernel of shape (units, output_size), in canonical order
+                self.kernel = tf.SparseTensor(indices=np.stack([cols, rows], axis=1), values=weights,
+                                              dense_shape=[self.units, self.output_size])
+            else:
+                kernel = np.zeros((self.output_size, self.units), dtype='float32')
+                kernel[rows, cols] = weights
+                self.kernel = K.constant(kernel)
         super(KaulosWrapperCell, self).build(input_shape)
-    def call(self, inputs, states):
+    def access_index(self, name):
+        """Returns the columns of the cell input that feed an access of the components, in component order.
+        # Arguments:
+            name (str): Name of the access, e.g. 'I'.
+        """
+        index = []
+        offset = 0
+        for i in self.components:
+            component_units = i._COMPONENT_UNITS
+            for j, a in enumerate(i.lpu_attributes.accesses):
+                if a == name:
+                    index.extend(range(offset + j * component_units, offset + (j + 1) * component_units))
+            offset += i.units
+        return np.array(index, dtype='int32')
+    def route(self, output):
+        """Routes the outputs of the previous step to the inputs through the connectivity.
+        # Arguments:
+            output (tensor): Output of the previous step, of shape (batch_size, output_size).
+        """
+        if self.sparse and _BACKEND == 'tensorflow':
+            return tf.transpose(tf.sparse_tensor_dense_matmul(self.kernel, output, adjoint_b=True))
+        return K.dot(output, self.kernel)
+    def route_delayed(self, output, buffer, counter):
+        """Writes the outputs of the previous step into the delay ring buffer at the head position and routes the delayed values to the inputs.
+        # Arguments:
+            output (tensor): Output of the previous step, of shape (batch_size, output_size).
+            buffer (tensor): Ring buffer of shape (batch_size, delay_length * len(delay_sources)).
+            counter (tensor): int32 step counter of shape (batch_size, 1); the head is the counter modulo delay_length.
+        """
+        sources, cols, weights, delays, slots = self.delay_tensors
+        n_sources = len(self.delay_sources)
+        head = tf.floormod(K.cast(counter[0, 0], 'int32'), self.delay_length)
+        write = K.cast(K.equal(tf.range(self.delay_length), head), K.floatx())[None, :, None]
+        values = tf.gather(output, sources, axis=1)[:, None, :]
+        buffer = K.reshape(buffer, (-1, self.delay_length, n_sources))
+        buffer = K.reshape(buffer * (1.0 - write) + values * write, (-1, self.delay_length * n_sources))
+        read = tf.floormod(head - delays, self.delay_length) * n_sources + slots
+        delayed_values = tf.gather(buffer, read, axis=1) * weights
+        delayed_inputs = tf.transpose(tf.unsorted_segment_sum(tf.transpose(delayed_values), cols, self.units))
+        return delayed_inputs, buffer
+    def evaluate_stimuli(self, counter):
+        """Evaluates the stimuli at the current step and arranges them into the input layout of the cell.
+        # Arguments:
+            counter (tensor): int32 step counter of shape (batch_size, 1).
+        """
+        values = K.concatenate([i.evaluate_step(counter, self.dt) for i in self.stimuli], axis=-1)
+        return tf.transpose(tf.unsorted_segment_sum(tf.transpose(values), self.stimulus_columns, self.units))
+    def variable_index(self, name):
+        """Returns the columns of the cell output that hold an alter of the components, in component order.
+        # Arguments:
+            name (str): Name of the alter, e.g. 'V' or 'spike'.
+        """
+        index = []
+        offset = 0
+        for i in self.components:
+            component_units = i._COMPONENT_UNITS
+            for a in i.lpu_attributes.alters:
+                if a == name:
+                    index.extend(range(offset, offset + component_units))
+                offset += component_units
+        return np.array(index, dtype='int32')
+    def get_param_values(self, component):
+        """Returns the current param values of a component, read from the layer that simulates it; see _KaulosModel.get_param_values.
+        # Arguments:
+            component (int): Index of the component.
+        """
+        layer, begin, end = self.component_slices[component]
+        values = self.layers[layer].get_param_values()
+        if self.layers[layer] is self.components[component]:
+            return values
+        return OrderedDict((a, b if a == 'dt' else b[:, begin:end]) for a, b in values.items())
+    def set_param_values(self, component, values):
+        """Writes param values of a component into the layer that simulates it, and into the component itself so that it stays current.
+        # Arguments:
+            component (int): Index of the component.
+            values (dict): Per-unit arrays or scalars by parameter name.
+        """
+        layer, begin, end = self.component_slices[component]
+        population = self.layers[layer]
+        if population is not self.components[component]:
+            rows = population.get_param_values()
+            fused = OrderedDict()
+            for a, b in values.items():
+                if a not in rows:
+                    raise ValueError(type(population).__name__ + ' has no parameter ' + str(a) + '.')
+                if a == 'dt':
+                    raise ValueError('Component ' + str(component) + ' is fused into a population, so its dt cannot be changed.')
+                fused[a] = rows[a].copy()
+                fused[a][:, begin:end] = _unit_values(b, end - begin)
+            population.set_param_values(fused)
+        self.components[component].set_param_values(values)
+    def sweep_columns(self, component, name):
+        """Returns the columns of the sweep constant that hold a swept parameter, one per unit of the component.
+        # Arguments:
+            component (int): Index of the component.
+            name (str): Name of the parameter.
+        """
+        k = self.sweep.index((component, name))
+        return np.arange(self.sweep_offsets[k], self.sweep_offsets[k + 1])
+    def apply_sweep(self, values):
+        """Replaces the swept params of the layers by columns of the sweep constant and re-evaluates their derived params.
+        # Arguments:
+            values (tensor): Sweep constant of shape (batch_size, sweep_size).
+        # Returns:
+            The replaced params, for restore_sweep.
+        """
+        saved = []
+        for layer, name, begin, end in self.sweep_targets:
+            i = self.layers[layer]
+            saved.append((i, name, i.lpu_attributes.params[name], i.lpu_attributes.derived))
+            i.lpu_attributes.params[name] = values[:, begin:end]
+        for layer in set(j[0] for j in self.sweep_targets):
+            self.layers[layer].lpu_attributes.derived = self.layers[layer].derived_params()
+        return saved
+    def restore_sweep(self, saved):
+        """Puts back the params replaced by apply_sweep.
+        # Arguments:
+            saved (list of tuples): The return value of apply_sweep.
+        """
+        for i, name, value, derived in reversed(saved):
+            i.lpu_attributes.params[name] = value
+            i.lpu_attributes.derived = derived
+    def partition(self, inputs, states):
+        """Splits the inputs and states of the circuit into the parts that belong to each component, using the offset tables computed in build.
+        # Arguments:
+            inputs (tensor): Input tensor.
+            states (list of tensors): List of state tensors.
+        """
+        input_parts = _split_columns(inputs, self.unit_sizes)
+        output_parts = _split_columns(states[0], self.output_sizes)
+        call_states = []
+        if len(self.inters_splits)>0:
+            inters_parts = iter(_split_columns(states[1], self.inters_splits))
+        for ii in range(len(self.layers)):
+            if self.state_ind_len[ii]>0:
+                call_states.append([output_parts[ii], next(inters_parts)])
+            else:
+                call_states.append([output_parts[ii]])
+        return input_parts, call_states
+    def call(self, inputs, states, constants = None):
         """Call function that handles the wiring between all the different component layers; from the Keras model specification format.
         # Arguments:
             inputs (tensor): Input tensor.
             states (list of tensors): List of state tensors.
+            constants (list of tensors): The sweep constant, when the cell sweeps params.
         """
+        extra_states = list(states[self.core_states:])
+        states = list(states[:self.core_states])
+        new_extra_states = []
+        if self.counter:
+            counter = extra_states[0]
+            new_extra_states.append(counter + 1)
         # Update connectivities
-        #inputs = K.dot( inputs, self.kernel)
-        # Initialize circuit
-        out_states = []
+        if self.W is not None:
+            with profile_scope(self.profiler, 'cell', 'route'):
+                inputs = inputs + self.route(states[0])
+        if self.delayed is not None:
+            with profile_scope(self.profiler, 'cell', 'delays'):
+                delayed_inputs, buffer = self.route_delayed(states[0], extra_states[1], counter)
+                inputs = inputs + delayed_inputs
+                new_extra_states.append(buffer)
+        if len(self.aggregators)>0:
+            with profile_scope(self.profiler, 'cell', 'aggregators'):
+                for i in self.aggregators:
+                    inputs = inputs + i.aggregate(states[0])
+        if len(self.stimuli)>0:
+            with profile_scope(self.profiler, 'cell', 'stimuli'):
+                inputs = inputs + self.evaluate_stimuli(counter)
+        # Find the inputs and the states that belong to each component,
+        # call the components and collect the results
+        with profile_scope(self.profiler, 'cell', 'partition'):
+            if self.fused:
+                input_index, output_index, inters_index, output_inverse, inters_inverse = self.fused_indices
+                inputs = _gather_columns(inputs, input_index)
+                states = [_gather_columns(states[0], output_index)] + [_gather_columns(s, inters_index) for s in states[1:]]
+            input_parts, call_states = self.partition(inputs, states)
+        if len(self.sweep)>0:
+            if not constants:
+                raise ValueError('The cell sweeps params and needs the sweep values as a constant of shape (batch_size, ' + str(self.sweep_size) + ').')
+            saved = self.apply_sweep(constants[0])
         outs = []
-        ii = 0
-        #print(self.state_ind_len)
-        # Loop through components and find the correct indices from the inputs
-        # and the states that belong to them; call them and collect the results
-        #if _BACKEND == 'tensorflow':
-        #    tf.concat(states[1],a,[states[0].get_shape()[0], b])
-
-        for i in self.layers:
-            #print(range(int(sum(self.unit_sizes[:ii])),int(sum(self.unit_sizes[:ii+1]))))
-            #print(range(int(sum(self.state_ind_len[:ii])),int(sum(self.state_ind_len[:ii+1]))))
-            unit_range = range(int(sum(self.unit_sizes[:ii])),int(sum(self.unit_sizes[:ii+1])))
-            state_range = range(int(sum(self.state_ind_len[:ii])),int(sum(self.state_ind_len[:ii+1])))
-            call_states = []
-            if _BACKEND == 'theano':
-                if len(unit_range)>1:
-                    call_states.append(states[0][:,unit_range])
-                    if len(self.state_sizes[ii])>1:
-                        call_states.append(states[1][:,state_range])
-                    a, b = i.call(inputs[:,unit_range],call_states)
-                else:
-                    call_states.append(states[0][:,unit_range[0]:unit_range[0]+1])
-                    if len(self.state_sizes[ii])>1:
-                        call_states.append(states[1][:,state_range[0]:state_range[0]+1])
-                    a, b = i.call(inputs[:,unit_range[0]:unit_range[0]+1],call_states)
-                out_states.append(b)
-                outs += [a]
-                ii += 1
-            else:
-                if len(unit_range)>1:
-                    a = tf.constant(np.array([0, unit_range[0]]), dtype=tf.int32, name="kaulos_slice_begin")
-                    #print(unit_range)
-                    b = tf.constant(np.array([-1, len(unit_range)]), dtype=tf.int32, name="kaulos_slice_step")
-                    #print(state_range)
-
-                    #zero_ph = tf.placeholder("int32")
-                    call_states.append(tf.slice(states[0], a, b))
-                    if len(self.state_sizes[ii])>1:
-                        c = tf.constant(np.array([0, state_range[0]]), dtype=tf.int32, name="kaulos_slice_begin_t")
-                        d = tf.constant(np.array([-1, len(state_range)]), dtype=tf.int32, name="kaulos_slice_step_t")
-                        #a = tf.constant([0,state_range[0]], dtype=tf.int32, name="kaulos_slice_begin")
-                        #b = tf.constant(state_range[1:], dtype=tf.int32, name="kaulos_slice_step")
-                        call_states.append(tf.slice(states[1], c, d))
-                    #a = tf.constant([0,unit_range[0]], dtype=tf.int32, name="kaulos_slice_begin")
-                    #b = tf.constant(unit_range[1:], dtype=tf.int32, name="kaulos_slice_step")
-                    a, b = i.call(tf.slice(inputs, a, b),call_states)
-                else:
-                    a = tf.constant(np.array([0, unit_range[0]]), dtype=tf.int32, name="kaulos_slice_begin")
-                    b = tf.constant(np.array([-1, 1]), dtype=tf.int32, name="kaulos_slice_step")
-
-                    call_states.append(tf.slice(states[0], a, b))
-                    if len(self.state_sizes[ii])>1:
-                        c = tf.constant(np.array([0, state_range[0]]), dtype=tf.int32, name="kaulos_slice_begin_t")
-                        d = tf.constant(np.array([-1, 1]), dtype=tf.int32, name="kaulos_slice_step_t")
-                        call_states.append(tf.slice(states[1], c, d))
-                    a, b = i.call(tf.slice(inputs, a, b),call_states)
-                out_states.append(b)
-                outs += [a]
-                ii += 1
+        alters = []
+        inters = []
+        for ii, i in enumerate(self.layers):
+            a, b = i.call(input_parts[ii], call_states[ii], substeps = self.substeps, reduce = self.substep_reduce,
+                          profiler = self.profiler, name = self.layer_names[ii])
+            outs.append(a)
+            alters.append(b[0])
+            if len(b)>1:
+                inters.append(b[1])
+        if len(self.sweep)>0:
+            self.restore_sweep(saved)
 
         # Combine all outputs into a single tensor
-        output = outs[0]
-        inters_exist = False
-        if len(outs)>1:
-            for i in range(len(outs)-1):
-                output = K.concatenate([output, outs[i+1]], axis=-1)
-        #print(out_states)
-        for i in range(len(out_states)):
-            if len(out_states[i])>1:
-                if inters_exist == False:
-                    inters_exist = True
-                    inters = out_states[i][1]
-                else:
-                    inters = K.concatenate([inters, out_states[i][1]], axis=-1)
+        with profile_scope(self.profiler, 'cell', 'concat'):
+            output = _concat_columns(outs)
+            alters = output if self.substep_reduce == 'last' else _concat_columns(alters)
+            inters_exist = len(inters)>0
+            if inters_exist:
+                inters = _concat_columns(inters)
+            if self.fused:
+                output = _gather_columns(output, output_inverse)
+                alters = output if self.substep_reduce == 'last' else _gather_columns(alters, output_inverse)
+                if inters_exist:
+                    inters = _gather_columns(inters, inters_inverse)
 
         # Finally, add the outputs to the output states
-        out_states = [output] + out_states
-        #print("Input Tensor: " + str(inputs))
-        #print("Input State Tensor: " + str(states))
-        #print("Output Tensor: " + str(output))
-        #if type(self.state_size) is list:
-        #    print("Input State Tensor: " + str([output, inters]))
-        if type(self.state_size) is list:
-            return output, [output, inters]
+        if inters_exist:
+            return output, [alters, inters] + new_extra_states
         else:
-            return output, [output]
+            return output, [alters] + new_extra_states
@@ -0,0 +1,115 @@
+from .compact_dependencies import *
+
+def _rate(derivative, x):
+    """Evaluates a derivative declared either as a tensor or as a linear pair (A, B) meaning dx/dt = A - B * x.
+    # Arguments:
+        derivative (tensor or tuple of tensors): The declared derivative.
+        x (tensor): Current value of the variable.
+    """
+    if isinstance(derivative, tuple):
+        A, B = derivative
+        return A - B * x
+    return derivative
+
+def forward_euler(derivatives, x, dt):
+    """Advances the variables by one forward Euler step.
+    # Arguments:
+        derivatives (function): Maps an OrderedDict of variable values to an OrderedDict of their derivatives.
+        x (OrderedDict of tensors): Current values of the variables.
+        dt (float): Duration of the step.
+    """
+    d = derivatives(x)
+    return OrderedDict((a, x[a] + dt * _rate(d[a], x[a])) for a in x)
+
+def runge_kutta4(derivatives, x, dt):
+    """Advances the variables by one classical fourth order Runge-Kutta step.
+    # Arguments:
+        derivatives (function): Maps an OrderedDict of variable values to an OrderedDict of their derivatives.
+        x (OrderedDict of tensors): Current values of the variables.
+        dt (float): Duration of the step.
+    """
+    def rates(y):
+        d = derivatives(y)
+        return OrderedDict((a, _rate(d[a], y[a])) for a in y)
+    k1 = rates(x)
+    k2 = rates(OrderedDict((a, x[a] + 0.5 * dt * k1[a]) for a in x))
+    k3 = rates(OrderedDict((a, x[a] + 0.5 * dt * k2[a]) for a in x))
+    k4 = rates(OrderedDict((a, x[a] + dt * k3[a]) for a in x))
+    return OrderedDict((a, x[a] + dt / 6.0 * (k1[a] + 2.0 * k2[a] + 2.0 * k3[a] + k4[a])) for a in x)
+
+def exponential_euler(derivatives, x, dt):
+    """Advances the variables by one exponential Euler step.
+    Variables declared as (A, B) are updated with the exact solution for A and B frozen over the step,
+    x + dt * (A - B * x) * (1 - exp(-B dt)) / (B dt), which stays within bounds for stiff gating variables; the others take a forward Euler step.
+    # Arguments:
+        derivatives (function): Maps an OrderedDict of variable values to an OrderedDict of their derivatives.
+        x (OrderedDict of tensors): Current values of the variables.
+        dt (float): Duration of the step.
+    """
+    d = derivatives(x)
+    new_x = OrderedDict()
+    for a in x:
+        if isinstance(d[a], tuple):
+            A, B = d[a]
+            Bdt = B * dt
+            # Second order series where B dt is too small for the closed form to be accurate
+            small = K.cast(K.less(K.abs(Bdt), 1e-3), K.floatx())
+            safe = Bdt + small
+            phi = small * (1.0 - 0.5 * Bdt) + (1.0 - small) * (1.0 - K.exp(-safe)) / safe
+            new_x[a] = x[a] + dt * (A - B * x[a]) * phi
+        else:
+            new_x[a] = x[a] + dt * d[a]
+    return new_x
+
+def integrate_step(integrator, derivatives, x, dt):
+    """Advances the variables by one step with the named integrator.
+    # Arguments:
+        integrator (str): One of 'euler', 'rk4' or 'exponential_euler'.
+        derivatives (function): Maps an OrderedDict of variable values to an OrderedDict of their derivatives.
+        x (OrderedDict of tensors): Current values of the variables.
+        dt (float): Duration of the step.
+    """
+    if integrator == 'euler':
+        return forward_euler(derivatives, x, dt)
+    if integrator == 'rk4':
+        return runge_kutta4(derivatives, x, dt)
+    if integrator == 'exponential_euler':
+        return exponential_euler(derivatives, x, dt)
+    raise ValueError('Unknown integrator ' + str(integrator) + "; expected 'euler', 'rk4' or 'exponential_euler'.")
+
+def expm(M):
+    """Matrix exponential of a batch of small square matrices, by scaling and squaring of the Taylor series.
+    # Arguments:
+        M (ndarray): Matrices of shape (..., n, n).
+    """
+    M = np.asarray(M, dtype='float64')
+    norm = np.abs(M).sum(axis=-1).max() if M.size > 0 else 0.0
+    squarings = int(max(0, np.ceil(np.log2(norm)) + 1)) if norm > 0 else 0
+    M = M / 2.0 ** squarings
+    E = np.broadcast_to(np.eye(M.shape[-1]), M.shape).copy()
+    term = E.copy()
+    for k in range(1, 19):
+        term = np.matmul(term, M) / k
+        E = E + term
+    for k in range(squarings):
+        E = np.matmul(E, E)
+    return E
+
+def linear_propagator(A, B, dt):
+    """Exact one-step propagator of the linear system dx/dt = A x + B u with u held constant over the step, so that x(t + dt) = Phi x(t) + Gamma u(t).
+    # Arguments:
+        A (ndarray): System matrices of shape (units, n, n).
+        B (ndarray): Input matrices of shape (units, n, m).
+        dt (float): Duration of the step.
+    # Returns:
+        Phi (ndarray): Shape (units, n, n).
+        Gamma (ndarray): Shape (units, n, m).
+    """
+    A = np.asarray(A, dtype='float64')
+    B = np.asarray(B, dtype='float64')
+    units, n, m = B.shape
+    augmented = np.zeros((units, n + m, n + m))
+    augmented[:, :n, :n] = A * dt
+    augmented[:, :n, n:] = B * dt
+    E = expm(augmented)
+    return E[:, :n, :n], E[:, :n, n:]
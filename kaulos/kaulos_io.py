@@ -0,0 +1,30 @@
+from __future__ import division, print_function
+
+# The file formats are imported inside the helpers so that importing kaulos
+# does not pay for them.
+
+def save_pickle(file_name, variable):
+    import pickle
+    output = open(file_name, 'wb')
+    pickle.dump(variable, output)
+    output.close()
+
+def load_pickle(file_name):
+    import pickle
+    pkl_file = open(file_name, 'rb')
+    variable = pickle.load(pkl_file)
+    pkl_file.close()
+    return variable
+
+def save_large_dataset(file_name, variable):
+    import h5py
+    h5f = h5py.File(file_name + '.h5', 'w')
+    h5f.create_dataset('variable', data=variable)
+    h5f.close()
+
+def load_large_dataset(file_name):
+    import h5py
+    h5f = h5py.File(file_name + '.h5','r')
+    variable = h5f['variable'][:]
+    h5f.close()
+    return variable
@@ -35,10 +35,12 @@ class IdealIAF(_KaulosModel):
     alters = OrderedDict([('V', 0.0), ('spike', 0.0)])
     inters = OrderedDict([])
     accesses = ['I']
+    def derived_params(self):
+        return OrderedDict([('dt_over_C', self.dt / self.C), ('double_threshold', 2.0 * self.threshold)])
     def kaulos_step(self):
-        V = self.V + self.dt * self.I / self.C
-        spike = K.round(V / (2.0 * self.threshold))
-        V = V - self.threshold * round_differentiable(V / (2.0 * self.threshold))
+        V = self.V + self.dt_over_C * self.I
+        spike = K.round(V / self.double_threshold)
+        V = V - self.threshold * round_differentiable(V / self.double_threshold)
         self.V = V
         self.spike = spike
 
@@ -46,15 +48,26 @@ IdealIntegrateAndFire = IdealIAF
 
 class LeakyIAF(_KaulosModel):
     """Leaky Integrate and Fire neuron model. This model has a spiking threshold, capacitance, and resistance.
+    With integrator = 'exact' the subthreshold dynamics dV/dt = I/C - V/(R C) are advanced with their exact propagator.
     """
     params = OrderedDict([('threshold', 1.0), ('R', 1.0), ('C', 1.0)])
     alters = OrderedDict([('V', 0.0), ('spike', 0.0)])
     inters = OrderedDict([])
     accesses = ['I']
+    integrators = ('exact',)
+    def linear_system(self, params):
+        A = np.reshape(-1.0 / (params['R'] * params['C']), (-1, 1, 1))
+        B = np.reshape(1.0 / params['C'], (-1, 1, 1))
+        return A, B
+    def derived_params(self):
+        return OrderedDict([('dt_over_C', self.dt / self.C), ('leak', 1.0 / (self.R * self.C)), ('double_threshold', 2.0 * self.threshold)])
     def kaulos_step(self):
-        V = self.V + self.dt * self.I / self.C - self.V / (self.R * self.C)
-        spike = K.round(V / (2.0 * self.threshold))
-        V = V - self.threshold * round_differentiable(V / (2.0 * self.threshold))
+        if self.integrator == 'exact':
+            V, = self.propagate([self.V], [self.I])
+        else:
+            V = self.V + self.dt_over_C * self.I - self.V * self.leak
+        spike = K.round(V / self.double_threshold)
+        V = V - self.threshold * round_differentiable(V / self.double_threshold)
         self.V = V
         self.spike = spike
 
@@ -67,8 +80,16 @@ class Integrator(_KaulosModel):
     alters = OrderedDict([('V', 0.0)])
     inters = OrderedDict([])
     accesses = ['I']
+    integrators = ('exact',)
+    def linear_system(self, params):
+        A = np.zeros((params['gain'].shape[-1], 1, 1))
+        B = np.reshape(params['gain'], (-1, 1, 1))
+        return A, B
     def kaulos_step(self):
-        V = self.V + self.dt * self.I * self.gain
+        if self.integrator == 'exact':
+            V, = self.propagate([self.V], [self.I])
+        else:
+            V = self.V + self.dt * self.I * self.gain
         self.V = V
 
 class Differentiator(_KaulosModel):
@@ -119,50 +140,90 @@ class VoltageToCurrent(_KaulosModel):
 
 class HodgkinHuxley(_KaulosModel):
     """Hodgkin-Huxley neuron model with some default channel parameters.
+    With integrator = None the hand-written forward Euler step is used; otherwise n, m, h and V are advanced from derivatives,
+    and 'exponential_euler' integrates the gating variables exactly for a frozen V.
+    With rate_table_step set, the six gating rates are interpolated from a table over rate_table_range instead of six exponentials per step.
     """
     params = OrderedDict([('g_K', 36.0),('g_Na', 120.0),('g_l', 0.3),('E_K', -12.),
               ('E_Na', 115.), ('E_l', 10.613)])
     alters = OrderedDict([('V', 0.0),('spike', 0.0)])
     inters = OrderedDict([('n', 0.0),('m', 0.0),('h', 1.0),('Vprev1', 0.0),('Vprev2', 0.0)])
     accesses = ['I']
+    integrators = ('euler', 'rk4', 'exponential_euler')
+    rate_table_range = (-100., 150.)
+    def rate_functions(self, V):
+        a_n = (25.0-V)/(10.0*(K.exp((25.0-V)/10.0)-1.0))
+        a_m = (10.0-V)/(100.0*(K.exp((10.0-V)/10.0)-1.0))
+        a_h = 0.07*K.exp(-V/20.0)
+
+        b_n = 4.0*K.exp(-1.0 * V/18.0)
+        b_m = 0.125*K.exp(-1.0 * V/80.0)
+        b_h = 1.0/(K.exp((30.0-V)/10.0)+1.0)
+        return OrderedDict([('a_n', a_n), ('a_m', a_m), ('a_h', a_h), ('b_n', b_n), ('b_m', b_m), ('b_h', b_h)])
+    def derivatives(self, x):
+        V = x['V']
+        r = self.rates(V)
+        a_n, a_m, a_h, b_n, b_m, b_h = r['a_n'], r['a_m'], r['a_h'], r['b_n'], r['b_m'], r['b_h']
+
+        I_K = self.g_K*K.pow(x['m'], 4)*(V-self.E_K)
+        I_Na = self.g_Na*K.pow(x['n'], 3)*x['h']*(V-self.E_Na)
+        I_l = self.g_l*(V-self.E_l)
+        return OrderedDict([('n', (a_n, a_n + b_n)), ('m', (a_m, a_m + b_m)), ('h', (a_h, a_h + b_h)),
+                            ('V', self.I - I_K - I_Na - I_l)])
     def kaulos_step(self):
         self.Vprev2 = self.Vprev1
         self.Vprev1 = self.V
-        a_n = (25.0-self.V)/(10.0*(K.exp((25.0-self.V)/10.0)-1.0))
-        a_m = (10.0-self.V)/(100.0*(K.exp((10.0-self.V)/10.0)-1.0))
-        a_h = 0.07*K.exp(-self.V/20.0)
-
-        b_n = 4.0*K.exp(-1.0 * self.V/18.0)
-        b_m = 0.125*K.exp(-1.0 * self.V/80.0)
-        b_h = 1.0/(K.exp((30.0-self.V)/10.0)+1.0)
-
-        n = self.n + self.dt*(a_n*(1.0-self.n) - b_n*self.n)
-        m = self.m + self.dt*(a_m*(1.0-self.m) - b_m*self.m)
-        h = self.h + self.dt*(a_h*(1.0-self.h) - b_h*self.h)
-        self.m = m
-        self.n = n
-        self.h = h
-        I_K = self.g_K*K.pow(self.m, 4)*(self.V-self.E_K)
-        I_Na = self.g_Na*K.pow(self.n, 3)*h*(self.V-self.E_Na)
-        I_l = self.g_l*(self.V-self.E_l)
-        I_channels = I_K + I_Na + I_l
-        V = self.V + self.dt*(self.I - I_channels)
-        self.V = V
+        if self.integrator is not None:
+            self.integrate(['n', 'm', 'h', 'V'])
+        else:
+            r = self.rates(self.V)
+            a_n, a_m, a_h, b_n, b_m, b_h = r['a_n'], r['a_m'], r['a_h'], r['b_n'], r['b_m'], r['b_h']
+
+            n = self.n + self.dt*(a_n*(1.0-self.n) - b_n*self.n)
+            m = self.m + self.dt*(a_m*(1.0-self.m) - b_m*self.m)
+            h = self.h + self.dt*(a_h*(1.0-self.h) - b_h*self.h)
+            self.m = m
+            self.n = n
+            self.h = h
+            I_K = self.g_K*K.pow(self.m, 4)*(self.V-self.E_K)
+            I_Na = self.g_Na*K.pow(self.n, 3)*h*(self.V-self.E_Na)
+            I_l = self.g_l*(self.V-self.E_l)
+            I_channels = I_K + I_Na + I_l
+            V = self.V + self.dt*(self.I - I_channels)
+            self.V = V
         spike = K.cast(greater_differentiable(self.Vprev1, self.V), 'float32') * K.cast(less_differentiable(self.Vprev2,self.Vprev1), 'float32') * K.cast(greater_differentiable(self.V, -30.), 'float32')
         self.spike = spike
 
 
 class AlphaSynapse(_KaulosModel):
     """An alpha synapse model.
+    With integrator = 'exact' the system a_0' = a_1, a_1' = -(ar + ad) a_1 - ar ad a_0 is advanced with its exact propagator
+    and every spike adds ar * ad to a_1, so large dt stays accurate.
     """
     params = OrderedDict([('ar', 4.0),('ad', 4.0), ('gmax', 100.), ('V_reverse_default', 100.)])
     alters = OrderedDict([('g', 0.0), ('V_reverse', 100.)])
     inters = OrderedDict([('a_0', 0.0),('a_1', 0.0),('a_2', 0.0)])
     accesses = ['spike']
+    integrators = ('exact',)
+    def linear_system(self, params):
+        ar, ad = params['ar'][0], params['ad'][0]
+        A = np.zeros((len(ar), 2, 2))
+        A[:, 0, 1] = 1.0
+        A[:, 1, 0] = -ar * ad
+        A[:, 1, 1] = -(ar + ad)
+        return A, np.zeros((len(ar), 2, 0))
+    def derived_params(self):
+        return OrderedDict([('ar_times_ad', self.ar * self.ad), ('ar_plus_ad', self.ar + self.ad)])
     def kaulos_step(self):
-        new_a_0 = K.maximum(0., self.a_0 + self.dt*self.a_1)
-        new_a_1 = self.a_1 + self.dt*self.a_2 + self.ar*self.ad*self.spike
-        new_a_2 = -(self.ar + self.ad)*self.a_1 - self.ar * self.ad * self.a_0
+        if self.integrator == 'exact':
+            a_0, a_1 = self.propagate([self.a_0, self.a_1], [])
+            new_a_0 = K.maximum(0., a_0)
+            new_a_1 = a_1 + self.ar_times_ad*self.spike
+            new_a_2 = -self.ar_plus_ad*new_a_1 - self.ar_times_ad * new_a_0
+        else:
+            new_a_0 = K.maximum(0., self.a_0 + self.dt*self.a_1)
+            new_a_1 = self.a_1 + self.dt*self.a_2 + self.ar_times_ad*self.spike
+            new_a_2 = -self.ar_plus_ad*self.a_1 - self.ar_times_ad * self.a_0
         g = K.minimum(self.gmax, self.gmax * new_a_0)
         self.a_0 = new_a_0
         self.a_1 = new_a_1
@@ -0,0 +1,237 @@
+from .compact_dependencies import *
+from .kaulos_engine import _KaulosModel
+import types
+
+class NumpyBackend(object):
+    """A NumPy stand-in for the subset of the Keras backend used inside kaulos_step functions.
+    Rebinding a model's step function onto this class lets it run on ndarrays without building a graph.
+    """
+    exp = staticmethod(np.exp)
+    log = staticmethod(np.log)
+    sqrt = staticmethod(np.sqrt)
+    square = staticmethod(np.square)
+    abs = staticmethod(np.abs)
+    sign = staticmethod(np.sign)
+    tanh = staticmethod(np.tanh)
+    round = staticmethod(np.round)
+    pow = staticmethod(np.power)
+    maximum = staticmethod(np.maximum)
+    minimum = staticmethod(np.minimum)
+    greater = staticmethod(np.greater)
+    greater_equal = staticmethod(np.greater_equal)
+    less = staticmethod(np.less)
+    less_equal = staticmethod(np.less_equal)
+    equal = staticmethod(np.equal)
+    zeros_like = staticmethod(np.zeros_like)
+    ones_like = staticmethod(np.ones_like)
+    @staticmethod
+    def cast(x, dtype):
+        return np.asarray(x).astype(dtype)
+    @staticmethod
+    def stop_gradient(x):
+        return x
+    @staticmethod
+    def sigmoid(x):
+        return 1.0 / (1.0 + np.exp(-x))
+    @staticmethod
+    def clip(x, min_value, max_value):
+        return np.clip(x, min_value, max_value)
+    @staticmethod
+    def switch(condition, then_expression, else_expression):
+        return np.where(condition, then_expression, else_expression)
+    @staticmethod
+    def concatenate(tensors, axis=-1):
+        return np.concatenate(tensors, axis=axis)
+    @staticmethod
+    def sum(x, axis=None, keepdims=False):
+        return np.sum(x, axis=axis, keepdims=keepdims)
+    @staticmethod
+    def epsilon():
+        return K.epsilon()
+    @staticmethod
+    def expand_dims(x, axis=-1):
+        return np.expand_dims(x, axis)
+    @staticmethod
+    def gather(reference, indices):
+        return np.asarray(reference)[indices]
+    @staticmethod
+    def floatx():
+        return K.floatx()
+
+def rebind_step(func, backend = NumpyBackend, memo = None):
+    """Rebinds a step function so that the name K inside it, and inside the Kaulos helper functions it calls, refers to another backend.
+    # Arguments:
+        func (function): The kaulos_step function of a model class, or any function written against the Keras backend.
+        backend (object): The backend namespace to use in place of keras.backend.
+        memo (dict): Cache of rebound module namespaces, shared between calls to rebind functions of the same modules only once.
+    """
+    if memo is None:
+        memo = {}
+    return types.FunctionType(func.__code__, _rebind_globals(func.__globals__, backend, memo), func.__name__, func.__defaults__, func.__closure__)
+
+def _rebind_globals(module_globals, backend, memo):
+    """Returns a copy of a module namespace where K is the given backend and the functions written against the Keras backend are rebound.
+    # Arguments:
+        module_globals (dict): The namespace of the module.
+        backend (object): The backend namespace to use in place of keras.backend.
+        memo (dict): Cache of rebound module namespaces.
+    """
+    if id(module_globals) in memo:
+        return memo[id(module_globals)]
+    new_globals = dict(module_globals)
+    memo[id(module_globals)] = new_globals
+    new_globals['K'] = backend
+    for name, value in module_globals.items():
+        if isinstance(value, types.FunctionType) and value.__globals__.get('K') is K and not value.__module__.startswith('keras'):
+            new_globals[name] = rebind_step(value, backend, memo)
+    return new_globals
+
+class _NumpyStepState(object):
+    """Attribute container that plays the role of self when a rebound kaulos_step is run on ndarrays.
+    Methods of the model are rebound onto the NumPy backend and bound to the container, so that helpers such as derivatives also run on ndarrays.
+    """
+    def __init__(self, model, methods):
+        object.__setattr__(self, '_model', model)
+        object.__setattr__(self, '_methods', methods)
+    def __getattr__(self, key):
+        method = getattr(type(self._model), key, None)
+        if isinstance(method, types.FunctionType):
+            if key not in self._methods:
+                self._methods[key] = rebind_step(method)
+            return types.MethodType(self._methods[key], self)
+        return getattr(self._model, key)
+
+class NumpyKaulosEngine(object):
+    """Pure NumPy engine that steps the components of a circuit directly on ndarrays.
+    Takes the same component list as KaulosWrapperCell and produces the same output and state layout, so the two can be swapped per job.
+    # Attributes:
+        layers (list of _KaulosModel): The components of the circuit.
+        units (int): Number of input variables in the circuit.
+        output_size (int): Number of output variables in the circuit.
+        state_size (int or list of ints): Size of the state variable matrices.
+    """
+    def __init__(self, layers, dtype = 'float32'):
+        """Initialization function for the NumpyKaulosEngine class.
+        # Arguments:
+            layers (list of _KaulosModel): The components of the circuit.
+            dtype (str): Floating point type used for the simulation.
+        """
+        self.layers = layers
+        self.dtype = dtype
+        self.units = 0
+        self.output_size = 0
+        self.inters_size = 0
+        self.unit_sizes = []
+        self.output_sizes = []
+        self.inters_sizes = []
+        self.steps = []
+        self.methods = []
+        for i in self.layers:
+            component_units = i._COMPONENT_UNITS
+            self.units += i.units
+            self.unit_sizes.append(i.units)
+            self.output_sizes.append(component_units * len(i.lpu_attributes.alters))
+            self.inters_sizes.append(component_units * len(i.lpu_attributes.inters))
+            self.steps.append(rebind_step(type(i).kaulos_step))
+            self.methods.append({})
+            i.check_hooks()
+            i.build_rate_table()
+        self.load_params()
+        self.output_size = sum(self.output_sizes)
+        self.inters_size = sum(self.inters_sizes)
+        if self.inters_size > 0:
+            self.state_size = [self.output_size, self.inters_size]
+        else:
+            self.state_size = self.output_size
+    def load_params(self):
+        """Reads the current param values of the layers and evaluates their derived params and exact propagators;
+        call it again after set_param_values of a layer. Rate tables only depend on V, so they are kept.
+        """
+        self.param_values = []
+        self.derived_values = []
+        for i, methods in zip(self.layers, self.methods):
+            i.build_propagator()
+            params = i.get_param_values()
+            for a in params:
+                if a != 'dt':
+                    params[a] = params[a].astype(self.dtype)
+            self.param_values.append(params)
+            state = _NumpyStepState(i, methods)
+            vars(state).update(params)
+            derived = state.derived_params()
+            if i.integrator == 'exact':
+                derived['propagator'] = i.propagator_values
+            if i.rate_table is not None:
+                derived['rate_table_values'] = i.rate_table.values
+            self.derived_values.append(derived)
+    def get_initial_state(self, batch_size):
+        """Returns the zero initial state, matching the Keras RNN default.
+        # Arguments:
+            batch_size (int): Number of samples in the batch.
+        """
+        if self.inters_size > 0:
+            return [np.zeros((batch_size, self.output_size), dtype=self.dtype),
+                    np.zeros((batch_size, self.inters_size), dtype=self.dtype)]
+        return [np.zeros((batch_size, self.output_size), dtype=self.dtype)]
+    def call(self, inputs, states):
+        """Advances the circuit by one step; mirrors KaulosWrapperCell.call.
+        # Arguments:
+            inputs (ndarray): Input array of shape (batch_size, units).
+            states (list of ndarrays): List of state arrays.
+        """
+        batch_size = inputs.shape[0]
+        outs = []
+        inters = []
+        unit_offset = 0
+        output_offset = 0
+        inters_offset = 0
+        for ii, i in enumerate(self.layers):
+            component_units = i._COMPONENT_UNITS
+            state = _NumpyStepState(i, self.methods[ii])
+            values = vars(state)
+            values.update(self.param_values[ii])
+            values.update(self.derived_values[ii])
+            j = output_offset
+            for a in i.lpu_attributes.alters:
+                values[a] = states[0][:, j:j+component_units]
+                j += component_units
+            j = inters_offset
+            for a in i.lpu_attributes.inters:
+                values[a] = states[1][:, j:j+component_units]
+                j += component_units
+            j = unit_offset
+            for a in i.lpu_attributes.accesses_tensors:
+                values[a] = inputs[:, j:j+component_units]
+                j += component_units
+            self.steps[ii](state)
+            for a in i.lpu_attributes.alters:
+                outs.append(np.broadcast_to(values[a], (batch_size, component_units)))
+            for a in i.lpu_attributes.inters:
+                inters.append(np.broadcast_to(values[a], (batch_size, component_units)))
+            unit_offset += self.unit_sizes[ii]
+            output_offset += self.output_sizes[ii]
+            inters_offset += self.inters_sizes[ii]
+        output = np.concatenate(outs, axis=-1).astype(self.dtype, copy=False)
+        if self.inters_size > 0:
+            return output, [output, np.concatenate(inters, axis=-1).astype(self.dtype, copy=False)]
+        return output, [output]
+    def simulate(self, inputs, initial_state = None, return_state = False):
+        """Runs the circuit over a whole input sequence; equivalent to RNN(cell, return_sequences = True).
+        # Arguments:
+            inputs (ndarray): Input array of shape (batch_size, timesteps, units).
+            initial_state (list of ndarrays): Optional initial states; zeros are used by default.
+            return_state (bool): Whether to also return the final states.
+        """
+        inputs = np.asarray(inputs, dtype=self.dtype)
+        batch_size, timesteps = inputs.shape[0], inputs.shape[1]
+        if initial_state is None:
+            states = self.get_initial_state(batch_size)
+        else:
+            states = [np.asarray(s, dtype=self.dtype) for s in initial_state]
+        outputs = np.zeros((batch_size, timesteps, self.output_size), dtype=self.dtype)
+        for t in range(timesteps):
+            output, states = self.call(inputs[:, t, :], states)
+            outputs[:, t, :] = output
+        if return_state:
+            return outputs, states
+        return outputs
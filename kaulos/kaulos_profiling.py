@@ -0,0 +1,97 @@
+from .compact_dependencies import *
+import contextlib
+import re
+
+_BACKEND = keras.backend.backend()
+
+class _NullScope(object):
+    """Reusable context manager that does nothing; used when profiling is disabled.
+    """
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+def profile_scope(profiler, component, phase):
+    """Returns the profiling scope of a phase of a component, or a no-op scope when profiler is None.
+    # Arguments:
+        profiler (KaulosProfiler): The profiler, or None.
+        component (str): Name of the component.
+        phase (str): Name of the phase, e.g. 'acquire', 'step' or 'distribute'.
+    """
+    if profiler is None:
+        return _NULL_SCOPE
+    return profiler.scope(component, phase)
+
+class KaulosProfiler(object):
+    """Opt-in per-component, per-phase profiler of KaulosWrapperCell, passed as KaulosWrapperCell(..., profiler = KaulosProfiler()).
+    Each phase is built inside a named scope 'kaulos_profile/<component>/<phase>'. The ops of the phase are counted while the graph is built,
+    and their run times are collected from a traced run with profile. Without a profiler the cell builds exactly the same graph as before.
+    # Attributes:
+        op_counts (OrderedDict): Number of graph ops by (component, phase).
+        seconds (OrderedDict): Total op run time in seconds by (component, phase), summed over the profiled runs.
+        calls (OrderedDict): Number of op executions by (component, phase).
+    """
+    SCOPE = 'kaulos_profile'
+    def __init__(self):
+        """Initialization function for the KaulosProfiler class.
+        """
+        if _BACKEND != 'tensorflow':
+            raise ValueError('Profiling requires the TensorFlow backend.')
+        self.op_counts = OrderedDict()
+        self.seconds = OrderedDict()
+        self.calls = OrderedDict()
+        self.pattern = re.compile(self.SCOPE + r'(?:_\d+)?/([^/]+?)(?:_\d+)?/([a-z]+)(?:_\d+)?/')
+    @contextlib.contextmanager
+    def scope(self, component, phase):
+        """Context manager that names and counts the ops of a phase of a component.
+        # Arguments:
+            component (str): Name of the component.
+            phase (str): Name of the phase; lowercase letters only.
+        """
+        graph = tf.get_default_graph()
+        before = len(graph.get_operations())
+        with tf.name_scope(self.SCOPE + '/' + component + '/' + phase):
+            yield
+        key = (component, phase)
+        self.op_counts[key] = self.op_counts.get(key, 0) + len(graph.get_operations()) - before
+    def profile(self, model, inputs):
+        """Runs a model once with full tracing and adds the op run times to the report.
+        # Arguments:
+            model (Model): A Keras model that contains the profiled cell.
+            inputs (ndarray or list of ndarrays): The inputs of the model.
+        # Returns:
+            The outputs of the model.
+        """
+        run_metadata = tf.RunMetadata()
+        function = K.function(model.inputs, model.outputs, options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), run_metadata=run_metadata)
+        outputs = function(inputs if isinstance(inputs, list) else [inputs])
+        self.collect(run_metadata)
+        return outputs
+    def collect(self, run_metadata):
+        """Adds the op run times of a traced session run to the report.
+        # Arguments:
+            run_metadata (tf.RunMetadata): Metadata of a run with trace_level FULL_TRACE.
+        """
+        for device in run_metadata.step_stats.dev_stats:
+            for node in device.node_stats:
+                match = self.pattern.search(node.node_name + '/')
+                if match is None:
+                    continue
+                key = match.groups()
+                self.seconds[key] = self.seconds.get(key, 0.0) + (node.op_end_rel_micros - node.op_start_rel_micros) * 1e-6
+                self.calls[key] = self.calls.get(key, 0) + 1
+    def report(self):
+        """Returns one record per component and phase, with op count, executions and seconds, slowest first.
+        """
+        keys = list(self.op_counts) + [i for i in self.seconds if i not in self.op_counts]
+        records = [OrderedDict([('component', a), ('phase', b), ('ops', self.op_counts.get((a, b), 0)),
+                                ('calls', self.calls.get((a, b), 0)), ('seconds', self.seconds.get((a, b), 0.0))]) for a, b in keys]
+        return sorted(records, key=lambda i: -i['seconds'])
+    def reset(self):
+        """Clears the collected run times, keeping the op counts of the built graph.
+        """
+        self.seconds = OrderedDict()
+        self.calls = OrderedDict()
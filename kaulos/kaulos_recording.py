@@ -0,0 +1,166 @@
+from .compact_dependencies import *
+
+class HDF5Recorder(object):
+    """Appends simulation outputs to an HDF5 file while the simulation runs, with one resizable dataset per probed variable.
+    Each dataset has shape (batch_size, recorded_steps, n_units), where the units are the components that have the variable, in order.
+    # Attributes:
+        probes (OrderedDict): Maps each probed variable name to its columns in the cell output.
+        decimation (int): Only every decimation-th step is recorded.
+        steps (int): Number of simulation steps seen so far.
+    """
+    def __init__(self, file_name, cell, probes = None, decimation = 1, compression = None, chunk_len = 1024):
+        """Initialization function for the HDF5Recorder class.
+        # Arguments:
+            file_name (str): Name of the file to write, without the '.h5' extension.
+            cell (KaulosWrapperCell): The simulated circuit cell, used to locate the variables in its output.
+            probes (list of str): Names of the alters to record; all of them by default.
+            decimation (int): Records every decimation-th step.
+            compression (str): Optional h5py compression filter, e.g. 'gzip' or 'lzf'.
+            chunk_len (int): Number of steps per HDF5 chunk.
+        """
+        if probes is None:
+            probes = []
+            for i in cell.components:
+                for a in i.lpu_attributes.alters:
+                    if a not in probes:
+                        probes.append(a)
+        self.probes = OrderedDict()
+        for a in probes:
+            index = cell.variable_index(a)
+            if len(index) == 0:
+                raise ValueError('No component of the circuit has the variable ' + str(a) + '.')
+            self.probes[a] = index
+        self.decimation = int(decimation)
+        self.compression = compression
+        self.chunk_len = int(chunk_len)
+        self.steps = 0
+        import h5py
+        self.h5f = h5py.File(file_name + '.h5', 'w')
+        self.h5f.attrs['decimation'] = self.decimation
+        self.datasets = OrderedDict()
+    def create_datasets(self, batch_size):
+        """Creates the resizable datasets of the probes.
+        # Arguments:
+            batch_size (int): Number of samples in the batch.
+        """
+        for a, index in self.probes.items():
+            self.datasets[a] = self.h5f.create_dataset(a, shape=(batch_size, 0, len(index)),
+                                                       maxshape=(batch_size, None, len(index)),
+                                                       chunks=(1, self.chunk_len, len(index)),
+                                                       dtype='float32', compression=self.compression)
+            self.datasets[a].attrs['columns'] = index
+    def record(self, outputs):
+        """Appends an output chunk to the datasets.
+        # Arguments:
+            outputs (ndarray): Cell outputs of shape (batch_size, timesteps, output_size).
+        """
+        if len(self.datasets) == 0:
+            self.create_datasets(outputs.shape[0])
+        steps = np.arange((-self.steps) % self.decimation, outputs.shape[1], self.decimation)
+        self.steps += outputs.shape[1]
+        if len(steps) == 0:
+            return
+        for a, index in self.probes.items():
+            dataset = self.datasets[a]
+            begin = dataset.shape[1]
+            dataset.resize(begin + len(steps), axis=1)
+            dataset[:, begin:, :] = outputs[:, steps[:, None], index[None, :]]
+    def flush(self):
+        """Flushes the file to disk.
+        """
+        self.h5f.flush()
+    def close(self):
+        """Closes the file.
+        """
+        self.h5f.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+class SpikeEvents(object):
+    """Compact, array-backed list of spike events, stored as (batch, step, neuron) rows instead of dense spike traces.
+    Neurons are numbered in the order of KaulosWrapperCell.variable_index for the spike variable.
+    # Attributes:
+        events (ndarray): int64 array of shape (n_events, 3) with the batch, step and neuron of every event.
+        values (ndarray): float32 array with the value of the spike variable at every event, e.g. the number of spikes of a step with
+            substep_reduce = 'sum'; ones for plain spikes.
+        n_neurons (int): Number of neurons that can emit events.
+        n_steps (int): Number of simulated steps the events cover.
+        batch_size (int): Number of samples in the batch.
+    """
+    def __init__(self, events, n_neurons, n_steps, batch_size = 1, values = None):
+        """Initialization function for the SpikeEvents class.
+        # Arguments:
+            events (ndarray): Array of (batch, step, neuron) rows.
+            n_neurons (int): Number of neurons that can emit events.
+            n_steps (int): Number of simulated steps the events cover.
+            batch_size (int): Number of samples in the batch.
+            values (ndarray): Optional value of every event; every event counts as one spike if None.
+        """
+        self.events = np.asarray(events, dtype='int64').reshape((-1, 3))
+        if values is None:
+            values = np.ones(self.events.shape[0])
+        self.values = np.asarray(values, dtype='float32').reshape((-1,))
+        if self.values.shape[0] != self.events.shape[0]:
+            raise ValueError('Got ' + str(self.values.shape[0]) + ' values for ' + str(self.events.shape[0]) + ' events.')
+        self.n_neurons = int(n_neurons)
+        self.n_steps = int(n_steps)
+        self.batch_size = int(batch_size)
+    @property
+    def batch(self):
+        return self.events[:, 0]
+    @property
+    def steps(self):
+        return self.events[:, 1]
+    @property
+    def neurons(self):
+        return self.events[:, 2]
+    def __len__(self):
+        return self.events.shape[0]
+    @classmethod
+    def concatenate(cls, event_lists):
+        """Joins consecutive event lists, e.g. the chunks yielded by a streaming simulation.
+        # Arguments:
+            event_lists (list of SpikeEvents): Event lists with absolute step indices, in order.
+        """
+        event_lists = list(event_lists)
+        return cls(np.concatenate([i.events for i in event_lists], axis=0),
+                   event_lists[0].n_neurons,
+                   max(i.n_steps for i in event_lists),
+                   event_lists[0].batch_size,
+                   np.concatenate([i.values for i in event_lists], axis=0))
+    def raster(self, batch = 0):
+        """Returns the spike times and neurons of one sample, ready for a raster plot.
+        # Arguments:
+            batch (int): The sample to select.
+        """
+        selected = self.events[self.events[:, 0] == batch]
+        return selected[:, 1], selected[:, 2]
+    def counts(self, bin_steps, batch = 0):
+        """Counts the spikes of every neuron in consecutive bins of steps; every event counts with its value.
+        # Arguments:
+            bin_steps (int): Number of steps per bin.
+            batch (int): The sample to select.
+        # Returns:
+            ndarray of shape (n_bins, n_neurons).
+        """
+        selected = self.events[:, 0] == batch
+        steps, neurons = self.events[selected, 1], self.events[selected, 2]
+        n_bins = int(np.ceil(self.n_steps / float(bin_steps)))
+        flat = (steps // bin_steps) * self.n_neurons + neurons
+        return np.bincount(flat, weights=self.values[selected], minlength=n_bins * self.n_neurons).reshape((n_bins, self.n_neurons))
+    def rates(self, dt, bin_steps, batch = 0):
+        """Computes the firing rates of every neuron in consecutive bins of steps.
+        # Arguments:
+            dt (float): Duration of a step.
+            bin_steps (int): Number of steps per bin.
+            batch (int): The sample to select.
+        """
+        return self.counts(bin_steps, batch) / (bin_steps * dt)
+    def to_dense(self):
+        """Converts the events back into dense traces of the spike variable, of shape (batch_size, n_steps, n_neurons).
+        """
+        dense = np.zeros((self.batch_size, self.n_steps, self.n_neurons), dtype='float32')
+        dense[self.events[:, 0], self.events[:, 1], self.events[:, 2]] = self.values
+        return dense
@@ -0,0 +1,181 @@
+from .compact_dependencies import *
+from .kaulos_numpy import NumpyKaulosEngine
+from .kaulos_cache import _hash_value
+import hashlib
+import os
+
+def relax_resting_state(model_class, param_sets, accesses = None, integrator = None, rate_table_step = None, tol = 1e-6, max_steps = 1000000, check_every = 1000,
+                        engines = None):
+    """Finds the resting states of a model by stepping it with constant inputs until its alters and inters stop changing.
+    All param sets are relaxed together as the units of one population on the NumPy engine in double precision.
+    Steps are run from the initial values declared by the model class.
+    # Arguments:
+        model_class (class): A _KaulosModel subclass.
+        param_sets (list of dicts): Param values of every unit, with floats for all params of the model including dt; all units need the same dt.
+        accesses (dict): Constant value of every access, e.g. {'I': 0.0}; missing accesses are zero.
+        integrator (str): Integrator of the model; the class default if None.
+        rate_table_step (float): Optional rate table spacing of the model.
+        tol (float): Largest change of any state over check_every steps that counts as rest.
+        max_steps (int): Number of steps after which the relaxation gives up.
+        check_every (int): Number of steps between convergence checks.
+        engines (dict): Optional NumPy engines of earlier relaxations by model class, population size, integrator and rate table. An engine is
+            reused with new param values, so that a relaxation only builds a component, its weights and its rate table on the first use.
+    # Returns:
+        List with an OrderedDict of the resting value of every alter and inter, for every param set.
+    """
+    accesses = {} if accesses is None else accesses
+    n = len(param_sets)
+    if len(set(float(p['dt']) for p in param_sets)) > 1:
+        raise ValueError('All param sets of a relaxation need the same dt.')
+    kwargs = OrderedDict()
+    for a, b in model_class.params.items():
+        if a != 'dt':
+            values = np.array([float(p.get(a, b)) for p in param_sets])
+            kwargs[a] = values if n > 1 else float(values[0])
+    key = (model_class, n, integrator, rate_table_step)
+    if engines is not None and key in engines:
+        engine = engines[key]
+        model = engine.layers[0]
+        model.set_param_values(dict(kwargs, dt = float(param_sets[0]['dt'])))
+        engine.load_params()
+    else:
+        model = model_class(component_units = n, dt = float(param_sets[0]['dt']), integrator = integrator, rate_table_step = rate_table_step, **kwargs)
+        engine = NumpyKaulosEngine([model], dtype = 'float64')
+        if engines is not None:
+            engines[key] = engine
+    inputs = np.zeros((1, model.units))
+    for k, a in enumerate(model.lpu_attributes.accesses):
+        inputs[0, k*n:(k+1)*n] = accesses.get(a, 0.0)
+    names = [list(model_class.alters), list(model_class.inters)]
+    states = [np.repeat([list(model_class.alters.values())], n, axis=1)]
+    if len(names[1]) > 0:
+        states.append(np.repeat([list(model_class.inters.values())], n, axis=1))
+    states = [i.astype('float64') for i in states]
+    for step in range(0, max_steps, check_every):
+        previous = states
+        for t in range(check_every):
+            output, states = engine.call(inputs, states)
+        if max(np.max(np.abs(a - b)) for a, b in zip(states, previous)) < tol:
+            break
+    else:
+        raise ValueError(model_class.__name__ + ' did not come to rest within ' + str(max_steps) + ' steps; it may spike or oscillate with these params and inputs.')
+    return [OrderedDict((a, float(state[0, k*n + u])) for state, group in zip(states, names) for k, a in enumerate(group)) for u in range(n)]
+
+class RestingStateCache(object):
+    """Cache of the resting alters and inters of neuron and synapse models, used to warm-start simulations instead of running off the initial transient.
+    Resting states are computed with relax_resting_state and keyed on the model class, its param values, integrator, rate table and constant inputs.
+    With a directory they are also persisted as one .npz file per key, so that they are computed once across processes and sessions.
+    # Attributes:
+        directory (str): Directory of the persisted resting states, or None to keep them in memory only.
+        states (dict): The resting states in memory, by key.
+        tol (float): Convergence tolerance of the relaxation.
+        max_steps (int): Step limit of the relaxation.
+        engines (dict): The NumPy engines of the relaxations, reused by later relaxations of the same model class and population size.
+    """
+    def __init__(self, directory = None, tol = 1e-6, max_steps = 1000000):
+        """Initialization function for the RestingStateCache class.
+        # Arguments:
+            directory (str): Optional directory for persisting the resting states; created if needed.
+            tol (float): Convergence tolerance of the relaxation.
+            max_steps (int): Step limit of the relaxation.
+        """
+        self.directory = directory
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.states = {}
+        self.tol = tol
+        self.max_steps = max_steps
+        self.engines = {}
+    def key(self, model_class, params, accesses = None, integrator = None, rate_table_step = None):
+        """Returns the key of the resting state of one unit.
+        # Arguments:
+            model_class (class): A _KaulosModel subclass.
+            params (dict): Param values of the unit, including dt.
+            accesses (dict): Constant value of every access.
+            integrator (str): Integrator of the model.
+            rate_table_step (float): Rate table spacing of the model.
+        """
+        h = hashlib.sha1()
+        # Params are compared in single precision, the precision of the params of built models
+        _hash_value(h, [model_class.__module__ + '.' + model_class.__name__, dict((a, float(np.float32(b))) for a, b in params.items()),
+                        dict((a, float(b)) for a, b in (accesses or {}).items()), integrator, rate_table_step])
+        return h.hexdigest()
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+    def lookup(self, key):
+        """Returns a resting state from memory or disk, or None.
+        # Arguments:
+            key (str): The key of the resting state.
+        """
+        if key not in self.states and self.directory is not None and os.path.isfile(self.path(key)):
+            with np.load(self.path(key)) as values:
+                self.states[key] = OrderedDict((a, float(values[a])) for a in values['_names'])
+        return self.states.get(key)
+    def store(self, key, state):
+        """Keeps a resting state in memory and, with a directory, writes it to disk.
+        # Arguments:
+            key (str): The key of the resting state.
+            state (OrderedDict of floats): The resting value of every alter and inter.
+        """
+        self.states[key] = state
+        if self.directory is not None:
+            temporary = self.path(key) + '.tmp'
+            with open(temporary, 'wb') as f:
+                np.savez(f, _names=np.array(list(state)), **state)
+            os.replace(temporary, self.path(key))
+    def get_many(self, model_class, param_sets, accesses = None, integrator = None, rate_table_step = None):
+        """Returns the resting states of many units; units missing from the cache are relaxed together, one population per dt.
+        # Arguments:
+            model_class (class): A _KaulosModel subclass.
+            param_sets (list of dicts): Param values of every unit, including dt.
+            accesses (dict): Constant value of every access.
+            integrator (str): Integrator of the model.
+            rate_table_step (float): Rate table spacing of the model.
+        """
+        keys = [self.key(model_class, p, accesses, integrator, rate_table_step) for p in param_sets]
+        missing = OrderedDict()
+        for key, p in zip(keys, param_sets):
+            if self.lookup(key) is None:
+                missing.setdefault(float(p['dt']), OrderedDict())[key] = p
+        for group in missing.values():
+            states = relax_resting_state(model_class, list(group.values()), accesses, integrator, rate_table_step, tol = self.tol, max_steps = self.max_steps,
+                                         engines = self.engines)
+            for key, state in zip(group, states):
+                self.store(key, state)
+        return [self.states[key] for key in keys]
+    def get(self, model_class, params = None, accesses = None, integrator = None, rate_table_step = None):
+        """Returns the resting value of every alter and inter of one unit.
+        # Arguments:
+            model_class (class): A _KaulosModel subclass.
+            params (dict): Param values; the class defaults fill in the missing ones.
+            accesses (dict): Constant value of every access.
+            integrator (str): Integrator of the model.
+            rate_table_step (float): Rate table spacing of the model.
+        """
+        values = OrderedDict(model_class.params)
+        values.setdefault('dt', 1e-3)
+        values.update(params or {})
+        return self.get_many(model_class, [values], accesses, integrator, rate_table_step)[0]
+    def initial_state(self, cell, accesses = None, batch_size = 1):
+        """Returns initial states of a cell with every component at rest, to pass to build_simulation or StreamingSimulator.
+        The step counter and delay buffers of the cell start at zero.
+        # Arguments:
+            cell (KaulosWrapperCell): The circuit cell.
+            accesses (dict): Constant value of every access while at rest.
+            batch_size (int): Number of samples in the batch.
+        """
+        alters = []
+        inters = []
+        for ii, i in enumerate(cell.components):
+            values = cell.get_param_values(ii)
+            param_sets = [OrderedDict((a, b if a == 'dt' else b[0, u]) for a, b in values.items()) for u in range(i._COMPONENT_UNITS)]
+            states = self.get_many(type(i), param_sets, accesses, i.integrator, i.rate_table_step)
+            alters += [[state[a] for state in states] for a in i.lpu_attributes.alters]
+            inters += [[state[a] for state in states] for a in i.lpu_attributes.inters]
+        sizes = cell.state_size if hasattr(cell.state_size, '__len__') else [cell.state_size]
+        initial_state = [np.concatenate(alters)]
+        if cell.core_states > 1:
+            initial_state.append(np.concatenate(inters))
+        initial_state += [np.zeros(i) for i in sizes[len(initial_state):]]
+        dtypes = getattr(cell, 'state_dtypes', [K.floatx()] * len(initial_state))
+        return [np.repeat(a[None, :], batch_size, axis=0).astype(b) for a, b in zip(initial_state, dtypes)]
@@ -0,0 +1,388 @@
+from .compact_dependencies import *
+from .kaulos_recording import SpikeEvents
+from .kaulos_checkpoints import save_checkpoint, restore_checkpoint
+
+_BACKEND = keras.backend.backend()
+
+def _state_sizes(cell):
+    """Returns the state sizes of a cell as a list.
+    # Arguments:
+        cell (KaulosWrapperCell): The circuit cell.
+    """
+    if hasattr(cell.state_size, '__len__'):
+        return list(cell.state_size)
+    return [cell.state_size]
+
+def _state_dtypes(cell):
+    """Returns the data types of the states of a cell; all floatx, except the int32 step counter of a KaulosWrapperCell.
+    # Arguments:
+        cell (KaulosWrapperCell): The circuit cell.
+    """
+    return list(getattr(cell, 'state_dtypes', [K.floatx()] * len(_state_sizes(cell))))
+
+def _cast_states(cell, states):
+    """Converts state arrays to the data types of the states of a cell.
+    # Arguments:
+        cell (KaulosWrapperCell): The circuit cell.
+        states (list of ndarrays): The states.
+    """
+    return [np.asarray(a, dtype=b) for a, b in zip(states, _state_dtypes(cell))]
+
+class KaulosSimulation(Layer):
+    """Kaulos Simulation Layer class. Runs a KaulosWrapperCell over a sequence of inputs, either unrolled or inside a compiled loop.
+    In 'loop' mode the step is traced once into a tf.while_loop, so the graph size does not depend on the sequence length.
+    # Attributes:
+        cell (KaulosWrapperCell): The circuit cell to simulate.
+        mode (str): 'loop' for a constant-size while loop, 'unroll' for one subgraph per step.
+        return_sequences (bool): Whether to return the outputs of every step or only the last one.
+        return_state (bool): Whether to also return the final states.
+        event_variable (str): Optional alter, such as 'spike', that is returned as sparse events instead of dense columns.
+        timesteps (int): Optional number of steps to run from a constant input instead of an input sequence.
+        initial_values (list of ndarrays): Optional states that replace the zero initial states.
+    """
+    def __init__(self, cell, mode = 'loop', return_sequences = True, return_state = False, swap_memory = True, event_variable = None, timesteps = None,
+                 initial_values = None, **kwargs):
+        """Initialization function for the KaulosSimulation class.
+        # Arguments:
+            cell (KaulosWrapperCell): The circuit cell to simulate.
+            mode (str): 'loop' or 'unroll'.
+            return_sequences (bool): Whether to return the outputs of every step; with False the memory use is independent of the sequence length.
+            return_state (bool): Whether to also return the final states.
+            swap_memory (bool): Whether the loop may swap tensors kept for the backward pass to host memory.
+            event_variable (str): Optional alter to return as an int32 tensor of (batch, step, neuron) rows, one per nonzero value, followed by a tensor
+                of these values, e.g. spike counts with substep_reduce = 'sum'. Its columns are then left out of the dense output. Steps are counted from the start of the call and neurons index cell.variable_index(event_variable).
+            timesteps (int): Optional number of steps to run. The layer then takes an input of shape (batch_size, units) that is applied at every step,
+                which together with the stimuli of the cell avoids materializing a (batch_size, timesteps, units) input.
+            initial_values (list of ndarrays): Optional initial states of shape (batch_size, state_size), e.g. Checkpoint.initial_state();
+                states of one sample seed every sample of the batch.
+        """
+        if mode not in ('loop', 'unroll'):
+            raise ValueError('Unknown simulation mode: ' + str(mode))
+        if _BACKEND != 'tensorflow' and (mode == 'loop' or event_variable is not None):
+            raise ValueError('The loop simulation mode and event outputs require the TensorFlow backend.')
+        self.cell = cell
+        self.mode = mode
+        self.return_sequences = return_sequences
+        self.return_state = return_state
+        self.swap_memory = swap_memory
+        self.event_variable = event_variable
+        self.timesteps = timesteps
+        self.initial_values = None if initial_values is None else _cast_states(cell, initial_values)
+        if self.initial_values is not None and [i.shape[-1] for i in self.initial_values] != _state_sizes(cell):
+            raise ValueError('The initial values do not match the state sizes ' + str(_state_sizes(cell)) + ' of the cell.')
+        super(KaulosSimulation, self).__init__(**kwargs)
+    def build(self, input_shape):
+        """Builds the cell using the given input_shape; from the Keras model specification.
+        # Arguments:
+            input_shape (tuple of ints): The input shape to the layer, (batch_size, timesteps, units); a list that also holds the sweep shape for cells that sweep params.
+        """
+        if isinstance(input_shape, list):
+            input_shape = input_shape[0]
+        if not self.cell.built:
+            self.cell.build((input_shape[0], input_shape[-1]))
+            self.cell.built = True
+        self.trainable_weights += self.cell.trainable_weights
+        self.output_size = _state_sizes(self.cell)[0]
+        if self.event_variable is not None:
+            self.event_index = self.cell.variable_index(self.event_variable)
+            if len(self.event_index) == 0:
+                raise ValueError('No component of the circuit has the variable ' + str(self.event_variable) + '.')
+            self.dense_index = np.setdiff1d(np.arange(self.output_size), self.event_index).astype('int32')
+            self.output_size = len(self.dense_index)
+        super(KaulosSimulation, self).build(input_shape)
+    def compute_output_shape(self, input_shape):
+        """Computes the output shape; from the Keras model specification.
+        # Arguments:
+            input_shape (tuple of ints): The input shape to the layer.
+        """
+        if isinstance(input_shape, list):
+            input_shape = input_shape[0]
+        state_sizes = _state_sizes(self.cell)
+        output_size = state_sizes[0]
+        if self.event_variable is not None:
+            output_size -= len(self.cell.variable_index(self.event_variable))
+        if self.return_sequences:
+            output_shape = [(input_shape[0], self.timesteps if self.timesteps is not None else input_shape[1], output_size)]
+        else:
+            output_shape = [(input_shape[0], output_size)]
+        if self.event_variable is not None:
+            output_shape += [(None, 3), (None,)]
+        if self.return_state:
+            output_shape += [(input_shape[0], i) for i in state_sizes]
+        if len(output_shape) == 1:
+            return output_shape[0]
+        return output_shape
+    def compute_mask(self, inputs, mask = None):
+        """Masks are not supported; returns one empty mask per output.
+        # Arguments:
+            inputs (tensor): Input tensor, or list of the inputs and the sweep values.
+            mask (tensor): Input mask.
+        """
+        n_outputs = 1 + 2 * int(self.event_variable is not None)
+        if self.return_state:
+            n_outputs += len(_state_sizes(self.cell))
+        if n_outputs > 1:
+            return [None] * n_outputs
+        return None
+    def get_initial_state(self, inputs):
+        """Returns the initial state for the given inputs; zeros, matching the Keras RNN default, unless initial_values were given.
+        # Arguments:
+            inputs (tensor): Input tensor of shape (batch_size, timesteps, units).
+        """
+        initial_state = K.expand_dims(K.sum(K.zeros_like(inputs), axis=list(range(1, K.ndim(inputs)))))
+        states = [K.cast(K.tile(initial_state, [1, i]), dtype) for i, dtype in zip(_state_sizes(self.cell), _state_dtypes(self.cell))]
+        if self.initial_values is not None:
+            states = [a + K.constant(b, dtype=b.dtype.name) for a, b in zip(states, self.initial_values)]
+        return states
+    def call(self, inputs, initial_state = None):
+        """Runs the simulation; from the Keras model specification format.
+        # Arguments:
+            inputs (tensor): Input tensor of shape (batch_size, timesteps, units). For cells that sweep params,
+                a list of the inputs and the sweep values of shape (batch_size, cell.sweep_size).
+            initial_state (list of tensors): Optional initial states; zeros are used by default.
+        """
+        constants = None
+        if isinstance(inputs, list):
+            inputs, constants = inputs[0], list(inputs[1:])
+        if initial_state is None:
+            states = self.get_initial_state(inputs)
+        else:
+            states = list(initial_state)
+        if self.mode == 'unroll':
+            outputs, last_output, events, states = self.unrolled_steps(inputs, states, constants)
+        else:
+            outputs, last_output, events, states = self.looped_steps(inputs, states, constants)
+        results = [outputs if self.return_sequences else last_output]
+        if self.event_variable is not None:
+            results += list(events)
+        if self.return_state:
+            results += list(states)
+        if len(results) == 1:
+            return results[0]
+        return results
+    def split_events(self, output, t):
+        """Separates the event variable from an output of the cell.
+        # Arguments:
+            output (tensor): Cell output of shape (batch_size, cell_output_size).
+            t (tensor): The step index.
+        # Returns:
+            dense (tensor): The remaining columns of the output.
+            events (tuple of tensors): int32 tensor of (batch, step, neuron) rows for every nonzero value of the event variable, and the values,
+                so that negative, fractional and multiple counts, e.g. with substep_reduce = 'sum', are kept.
+        """
+        if self.event_variable is None:
+            return output, (None, None)
+        values = tf.gather(output, self.event_index, axis=1)
+        nonzero = tf.where(tf.not_equal(values, 0.0))
+        fired = K.cast(nonzero, 'int32')
+        steps = tf.fill(tf.shape(fired[:, :1]), t)
+        return tf.gather(output, self.dense_index, axis=1), (tf.concat([fired[:, :1], steps, fired[:, 1:]], axis=1), tf.gather_nd(values, nonzero))
+    def unrolled_steps(self, inputs, states, constants = None):
+        """Builds one step subgraph per timestep.
+        # Arguments:
+            inputs (tensor): Input tensor of shape (batch_size, timesteps, units).
+            states (list of tensors): Initial states.
+            constants (list of tensors): Optional sweep values passed to the cell.
+        """
+        timesteps = self.timesteps if self.timesteps is not None else K.int_shape(inputs)[1]
+        if timesteps is None:
+            raise ValueError('The unroll simulation mode requires a known number of timesteps.')
+        outputs = []
+        events = []
+        event_values = []
+        for t in range(timesteps):
+            output, states = self.cell.call(inputs if self.timesteps is not None else inputs[:, t, :], states, constants = constants)
+            output, (step_events, step_values) = self.split_events(output, t)
+            if self.return_sequences:
+                outputs.append(output)
+            events.append(step_events)
+            event_values.append(step_values)
+        if self.return_sequences:
+            outputs = K.stack(outputs, axis=1)
+        if self.event_variable is not None:
+            events = (tf.concat(events, axis=0), tf.concat(event_values, axis=0))
+        return outputs, output, events, states
+    def looped_steps(self, inputs, states, constants = None):
+        """Traces the step once into a tf.while_loop that runs over all timesteps.
+        # Arguments:
+            inputs (tensor): Input tensor of shape (batch_size, timesteps, units).
+            states (list of tensors): Initial states.
+            constants (list of tensors): Optional sweep values passed to the cell.
+        """
+        if self.timesteps is not None:
+            timesteps = tf.constant(self.timesteps, dtype='int32')
+            read_inputs = lambda t: inputs
+        else:
+            timesteps = tf.shape(inputs)[1]
+            inputs_ta = tf.TensorArray(dtype=inputs.dtype, size=timesteps).unstack(tf.transpose(inputs, [1, 0, 2]))
+            read_inputs = inputs_ta.read
+        outputs_ta = tf.TensorArray(dtype=inputs.dtype, size=timesteps if self.return_sequences else 1)
+        events_ta = tf.TensorArray(dtype='int32', size=timesteps if self.event_variable is not None else 1, infer_shape=False)
+        values_ta = tf.TensorArray(dtype=inputs.dtype, size=timesteps if self.event_variable is not None else 1, infer_shape=False)
+        last_output = tf.zeros_like(states[0][:, :self.output_size])
+        def step(t, outputs_ta, events_ta, values_ta, last_output, *states):
+            output, new_states = self.cell.call(read_inputs(t), list(states), constants = constants)
+            output, (step_events, step_values) = self.split_events(output, t)
+            if self.return_sequences:
+                outputs_ta = outputs_ta.write(t, output)
+            if self.event_variable is not None:
+                events_ta = events_ta.write(t, step_events)
+                values_ta = values_ta.write(t, step_values)
+            for new_state, state in zip(new_states, states):
+                new_state.set_shape(state.get_shape())
+            return (t + 1, outputs_ta, events_ta, values_ta, output) + tuple(new_states)
+        results = tf.while_loop(lambda t, *args: t < timesteps, step,
+                                (tf.constant(0, dtype='int32'), outputs_ta, events_ta, values_ta, last_output) + tuple(states),
+                                parallel_iterations=1, swap_memory=self.swap_memory)
+        outputs = None
+        if self.return_sequences:
+            outputs = tf.transpose(results[1].stack(), [1, 0, 2])
+        events = None
+        if self.event_variable is not None:
+            events = (results[2].concat(), results[3].concat())
+            events[0].set_shape((None, 3))
+            events[1].set_shape((None,))
+        return outputs, results[4], events, list(results[5:])
+
+def build_simulation(cell, input_shape, mode = 'loop', return_sequences = True, return_state = True, batch_size = None, timesteps = None, initial_state = None):
+    """Builds a Keras model that simulates a circuit cell and returns its outputs and final states.
+    # Arguments:
+        cell (KaulosWrapperCell): The circuit cell to simulate.
+        input_shape (tuple of ints): Shape of the inputs, (timesteps, units); timesteps may be None in 'loop' mode. With timesteps given, (units,).
+        mode (str): 'loop' or 'unroll'.
+        return_sequences (bool): Whether to return the outputs of every step or only the last one.
+        return_state (bool): Whether to also return the final states.
+        batch_size (int): Optional fixed batch size.
+        timesteps (int): Optional number of steps to run from a constant input of shape (batch_size, units).
+        initial_state (list of ndarrays): Optional initial states, e.g. from Checkpoint.initial_state(); zeros are used by default.
+    # Returns:
+        A Model that takes the inputs, or [inputs, sweep values] for cells that sweep params, so that predict runs one parameter set per sample.
+    """
+    if batch_size is None:
+        x = keras.Input(input_shape)
+    else:
+        x = keras.Input(batch_shape = (batch_size,) + tuple(input_shape))
+    layer = KaulosSimulation(cell, mode = mode, return_sequences = return_sequences, return_state = return_state, timesteps = timesteps,
+                             initial_values = initial_state)
+    if len(cell.sweep)>0:
+        p = keras.Input(batch_shape = (batch_size, cell.sweep_size))
+        return Model(inputs=[x, p], outputs=layer([x, p]))
+    return Model(inputs=x, outputs=layer(x))
+
+class StreamingSimulator(object):
+    """Simulates a circuit cell chunk by chunk, carrying the alters and inters states from one chunk to the next.
+    The step function is compiled once, and only one chunk of inputs and outputs is held in memory at a time.
+    # Attributes:
+        cell (KaulosWrapperCell): The circuit cell to simulate.
+        chunk_len (int): Number of steps per chunk when slicing array inputs.
+        event_variable (str): Optional alter, such as 'spike', that is streamed as SpikeEvents instead of dense columns.
+        states (list of ndarrays): The states at the end of the last simulated chunk.
+        steps (int): Number of steps simulated so far.
+    """
+    def __init__(self, cell, chunk_len, initial_state = None, event_variable = None, sweep_values = None):
+        """Initialization function for the StreamingSimulator class.
+        # Arguments:
+            cell (KaulosWrapperCell): The circuit cell to simulate.
+            chunk_len (int): Number of steps per chunk when slicing array inputs.
+            initial_state (list of ndarrays): Optional initial states; zeros are used by default.
+            event_variable (str): Optional alter to stream as SpikeEvents; its columns are left out of the dense outputs.
+            sweep_values (ndarray): Per-sample params of shape (batch_size, cell.sweep_size), required for cells that sweep params.
+        """
+        if len(cell.sweep)>0 and sweep_values is None:
+            raise ValueError('The cell sweeps params, so sweep_values are required.')
+        self.cell = cell
+        self.chunk_len = int(chunk_len)
+        self.event_variable = event_variable
+        self.states = None if initial_state is None else _cast_states(cell, initial_state)
+        self.steps = 0
+        inputs = K.placeholder(shape=(None, None, cell.units))
+        initial_states = [K.placeholder(shape=(None, i), dtype=dtype) for i, dtype in zip(_state_sizes(cell), _state_dtypes(cell))]
+        layer = KaulosSimulation(cell, mode = 'loop', return_sequences = True, return_state = True, event_variable = event_variable)
+        layer.build((None, None, cell.units))
+        layer.built = True
+        self.sweep_values = []
+        if len(cell.sweep)>0:
+            sweep = K.placeholder(shape=(None, cell.sweep_size))
+            self.sweep_values = [np.asarray(sweep_values, dtype=K.floatx())]
+            self.function = K.function([inputs, sweep] + initial_states, layer.call([inputs, sweep], initial_state = initial_states))
+        else:
+            self.function = K.function([inputs] + initial_states, layer.call(inputs, initial_state = initial_states))
+        if event_variable is not None:
+            self.n_neurons = len(layer.event_index)
+    def reset_states(self, batch_size):
+        """Resets the states to zeros.
+        # Arguments:
+            batch_size (int): Number of samples in the batch.
+        """
+        self.states = [np.zeros((batch_size, i), dtype=dtype) for i, dtype in zip(_state_sizes(self.cell), _state_dtypes(self.cell))]
+        self.steps = 0
+    def save_checkpoint(self, directory):
+        """Saves the states, param values and step counter of the simulation; see kaulos_checkpoints.save_checkpoint.
+        # Arguments:
+            directory (str): Directory of the checkpoint.
+        """
+        if self.states is None:
+            raise ValueError('There are no states to save before the first chunk.')
+        save_checkpoint(directory, self.cell, self.states, self.steps)
+    def restore_checkpoint(self, directory, mmap_mode = 'r'):
+        """Resumes from a checkpoint of the same circuit; the next chunk continues at step self.steps.
+        # Arguments:
+            directory (str): Directory of the checkpoint.
+            mmap_mode (str): Memory map mode of the saved states, as in np.load.
+        """
+        checkpoint = restore_checkpoint(directory, self.cell, mmap_mode = mmap_mode)
+        self.states = _cast_states(self.cell, checkpoint.initial_state())
+        self.steps = checkpoint.steps
+        return checkpoint
+    def chunks(self, input_source):
+        """Iterates over the input chunks of a source.
+        # Arguments:
+            input_source (array-like or iterable): An array-like of shape (batch_size, timesteps, units) that supports slicing, such as an ndarray, a memory map or an h5py dataset, or an iterable of such arrays.
+        """
+        if hasattr(input_source, 'shape') and len(input_source.shape) == 3:
+            for t in range(0, input_source.shape[1], self.chunk_len):
+                yield input_source[:, t:t+self.chunk_len, :]
+        else:
+            for chunk in input_source:
+                yield chunk
+    def run(self, input_source, checkpoint_directory = None, checkpoint_every = 1):
+        """Simulates the inputs chunk by chunk and yields the output of every chunk.
+        With an event_variable, yields (output, SpikeEvents) pairs whose event steps count from the start of the run.
+        After a restore, input_source should hold the inputs from step self.steps on.
+        # Arguments:
+            input_source (array-like or iterable): The inputs; see chunks.
+            checkpoint_directory (str): Optional directory that receives a checkpoint of the states every checkpoint_every chunks.
+            checkpoint_every (int): Number of chunks between checkpoints.
+        """
+        for k, chunk in enumerate(self.chunks(input_source)):
+            chunk = np.asarray(chunk, dtype=K.floatx())
+            if self.states is None:
+                self.reset_states(chunk.shape[0])
+            results = self.function([chunk] + self.sweep_values + self.states)
+            if self.event_variable is None:
+                self.states = list(results[1:])
+                self.steps += chunk.shape[1]
+                output = results[0]
+            else:
+                self.states = list(results[3:])
+                events = results[1].astype('int64')
+                events[:, 1] += self.steps
+                self.steps += chunk.shape[1]
+                output = results[0], SpikeEvents(events, self.n_neurons, self.steps, chunk.shape[0], values = results[2])
+            if checkpoint_directory is not None and (k + 1) % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_directory)
+            yield output
+
+def simulate_stream(cell, input_source, chunk_len, initial_state = None, event_variable = None, sweep_values = None):
+    """Generator that simulates a circuit cell chunk by chunk and yields each output chunk of shape (batch_size, chunk_len, output_size).
+    # Arguments:
+        cell (KaulosWrapperCell): The circuit cell to simulate.
+        input_source (array-like or iterable): An array-like of shape (batch_size, timesteps, units) that supports slicing, or an iterable of input chunks.
+        chunk_len (int): Number of steps per chunk when slicing array inputs.
+        initial_state (list of ndarrays): Optional initial states; zeros are used by default.
+        event_variable (str): Optional alter, such as 'spike', to yield as SpikeEvents next to the remaining dense outputs.
+        sweep_values (ndarray): Per-sample params of shape (batch_size, cell.sweep_size), for cells that sweep params.
+    """
+    simulator = StreamingSimulator(cell, chunk_len, initial_state = initial_state, event_variable = event_variable, sweep_values = sweep_values)
+    for output in simulator.run(input_source):
+        yield output
@@ -0,0 +1,122 @@
+from .compact_dependencies import *
+
+class _KaulosStimulus(object):
+    """Kaulos Stimulus class. A stimulus is evaluated from the simulation time inside KaulosWrapperCell and added to some of its input columns.
+    Stimuli hold only their parameters, so they cost O(number of stimuli) memory regardless of the sequence length.
+    # Attributes:
+        columns (ndarray of ints): Input columns of the cell that the stimulus drives; see KaulosWrapperCell.access_index.
+    """
+    def __init__(self, columns):
+        """Initialization function for the _KaulosStimulus class.
+        # Arguments:
+            columns (int or list of ints): Input columns of the cell that the stimulus drives.
+        """
+        self.columns = np.atleast_1d(np.asarray(columns, dtype='int32'))
+    def window(self, time, t_start, t_stop):
+        """Returns 1.0 while t_start <= time < t_stop and 0.0 otherwise.
+        # Arguments:
+            time (tensor): Simulation time of shape (batch_size, 1).
+            t_start (float): Start of the window.
+            t_stop (float): End of the window.
+        """
+        return K.cast(K.greater_equal(time, t_start), K.floatx()) * K.cast(K.less(time, t_stop), K.floatx())
+    def evaluate(self, time, dt):
+        """Placeholder evaluation function for the stimulus; gets overridden by the stimulus.
+        # Arguments:
+            time (tensor): Simulation time of shape (batch_size, 1).
+            dt (float): Duration of a step.
+        # Returns:
+            Tensor of shape (batch_size, len(columns)).
+        """
+        pass
+    def evaluate_step(self, step, dt):
+        """Evaluates the stimulus at a step; KaulosWrapperCell calls this with its step counter.
+        # Arguments:
+            step (tensor): Step counter of shape (batch_size, 1).
+            dt (float): Duration of a step.
+        """
+        if type(self).evaluate is _KaulosStimulus.evaluate:
+            raise ValueError(type(self).__name__ + ' does not define evaluate or evaluate_step.')
+        return self.evaluate(K.cast(step, K.floatx()) * dt, dt)
+
+class StepStimulus(_KaulosStimulus):
+    """A constant amplitude between t_start and t_stop, similar to InIStep in Phyllon.
+    """
+    def __init__(self, columns, amplitude, t_start, t_stop):
+        super(StepStimulus, self).__init__(columns)
+        self.amplitude = np.asarray(amplitude, dtype=K.floatx())
+        self.t_start = t_start
+        self.t_stop = t_stop
+    def evaluate(self, time, dt):
+        return self.window(time, self.t_start, self.t_stop) * np.ones(len(self.columns), dtype=K.floatx()) * self.amplitude
+
+class RampStimulus(_KaulosStimulus):
+    """A linear ramp from amplitude_start at t_start to amplitude_stop at t_stop; zero outside of the window.
+    """
+    def __init__(self, columns, amplitude_start, amplitude_stop, t_start, t_stop):
+        super(RampStimulus, self).__init__(columns)
+        self.amplitude_start = np.asarray(amplitude_start, dtype=K.floatx())
+        self.amplitude_stop = np.asarray(amplitude_stop, dtype=K.floatx())
+        self.t_start = t_start
+        self.t_stop = t_stop
+    def evaluate(self, time, dt):
+        fraction = (time - self.t_start) / (self.t_stop - self.t_start)
+        amplitude = self.amplitude_start + fraction * (self.amplitude_stop - self.amplitude_start)
+        return self.window(time, self.t_start, self.t_stop) * np.ones(len(self.columns), dtype=K.floatx()) * amplitude
+
+class SinusoidStimulus(_KaulosStimulus):
+    """A sinusoid offset + amplitude * sin(2 pi frequency (time - t_start) + phase) between t_start and t_stop.
+    """
+    def __init__(self, columns, amplitude, frequency, phase = 0.0, offset = 0.0, t_start = 0.0, t_stop = np.inf):
+        super(SinusoidStimulus, self).__init__(columns)
+        self.amplitude = np.asarray(amplitude, dtype=K.floatx())
+        self.frequency = np.asarray(frequency, dtype=K.floatx())
+        self.phase = np.asarray(phase, dtype=K.floatx())
+        self.offset = np.asarray(offset, dtype=K.floatx())
+        self.t_start = t_start
+        self.t_stop = t_stop
+    def evaluate(self, time, dt):
+        value = self.offset + self.amplitude * K.sin(2.0 * np.pi * self.frequency * (time - self.t_start) + self.phase)
+        return self.window(time, self.t_start, self.t_stop) * np.ones(len(self.columns), dtype=K.floatx()) * value
+
+class PoissonStimulus(_KaulosStimulus):
+    """Poisson spike trains with the given rate between t_start and t_stop; every spike lasts one step and has the given amplitude.
+    Every sample of the batch and every column draws its own spike train. The draws of a step come from a stateless generator seeded with
+    (seed, step), so they are reproducible, independent between steps, and the same in the loop and unrolled simulation modes.
+    Stimuli with equal seeds draw equal numbers, so give every PoissonStimulus of a cell its own seed.
+    """
+    def __init__(self, columns, rate, amplitude = 1.0, t_start = 0.0, t_stop = np.inf, seed = None):
+        super(PoissonStimulus, self).__init__(columns)
+        self.rate = np.asarray(rate, dtype=K.floatx())
+        self.amplitude = np.asarray(amplitude, dtype=K.floatx())
+        self.t_start = t_start
+        self.t_stop = t_stop
+        self.seed = np.random.randint(2 ** 31 - 1) if seed is None else int(seed)
+    def evaluate(self, time, dt):
+        return self.evaluate_step(K.cast(K.round(time / dt), 'int32'), dt)
+    def evaluate_step(self, step, dt):
+        time = K.cast(step, K.floatx()) * dt
+        shape = tf.stack([tf.shape(step)[0], len(self.columns)])
+        seed = tf.stack([tf.constant(self.seed, dtype='int32'), K.cast(step[0, 0], 'int32')])
+        uniform = tf.contrib.stateless.stateless_random_uniform(shape, seed, dtype=K.floatx())
+        spikes = K.cast(K.less(uniform, self.rate * dt), K.floatx())
+        return self.window(time, self.t_start, self.t_stop) * spikes * self.amplitude
+
+class PiecewiseStimulus(_KaulosStimulus):
+    """A piecewise-constant stimulus from a compact table: from times[k] on, the stimulus takes values[k]; before times[0] it is zero.
+    """
+    def __init__(self, columns, times, values):
+        """Initialization function for the PiecewiseStimulus class.
+        # Arguments:
+            columns (int or list of ints): Input columns of the cell that the stimulus drives.
+            times (list of floats): Increasing breakpoint times.
+            values (ndarray): Values of shape (len(times),) or (len(times), len(columns)).
+        """
+        super(PiecewiseStimulus, self).__init__(columns)
+        self.times = np.asarray(times, dtype=K.floatx())
+        values = np.asarray(values, dtype=K.floatx())
+        values = np.broadcast_to(np.reshape(values, (len(self.times), -1)), (len(self.times), len(self.columns)))
+        self.values = np.concatenate([np.zeros((1, len(self.columns)), dtype=K.floatx()), values], axis=0)
+    def evaluate(self, time, dt):
+        index = K.sum(K.cast(K.greater_equal(time, self.times[None, :]), 'int32'), axis=1)
+        return K.gather(K.constant(self.values), index)
@@ -0,0 +1,153 @@
+from .compact_dependencies import *
+from .kaulos_simulation import build_simulation
+import os
+import shutil
+import tempfile
+import time
+
+# State of a sweep worker process, set once by _init_worker
+_WORKER = {}
+
+def _attach(path, shape, dtype, mode = 'r'):
+    """Memory maps a shared buffer file; the pages are shared by every process that maps the file.
+    # Arguments:
+        path (str): Path of the buffer file.
+        shape (tuple of ints): Shape of the array.
+        dtype (str): Data type of the array.
+        mode (str): Memory map mode, 'r' to read, 'r+' to write or 'w+' to create.
+    """
+    return np.memmap(path, dtype=dtype, mode=mode, shape=tuple(shape))
+
+def _init_worker(build_cell, inputs_name, inputs_shape, dtype, mode, threads_per_worker):
+    """Builds the circuit once in a worker process and maps the shared inputs.
+    # Arguments:
+        build_cell (function): Returns the KaulosWrapperCell to simulate.
+        inputs_name (str): Path of the buffer file of the inputs.
+        inputs_shape (tuple of ints): Shape of the inputs.
+        dtype (str): Data type of the inputs and outputs.
+        mode (str): Simulation mode, 'loop' or 'unroll'.
+        threads_per_worker (int): Number of TensorFlow threads of the worker, so that the workers do not oversubscribe the cores.
+    """
+    start = time.time()
+    if keras.backend.backend() == 'tensorflow':
+        K.set_session(tf.Session(config=tf.ConfigProto(intra_op_parallelism_threads=threads_per_worker, inter_op_parallelism_threads=1)))
+    cell = build_cell()
+    _WORKER['inputs'] = _attach(inputs_name, inputs_shape, dtype)
+    _WORKER['dtype'] = dtype
+    _WORKER['model'] = build_simulation(cell, inputs_shape[-2:], mode = mode, return_state = False)
+    _WORKER['output_size'] = cell.output_size
+    _WORKER['sweep'] = len(cell.sweep)>0
+    _WORKER['build_seconds'] = time.time() - start
+
+def _worker_output_size():
+    """Returns the number of output columns of the circuit built by a worker.
+    """
+    return _WORKER['output_size']
+
+def _run_job(job):
+    """Simulates the samples of one job and writes their outputs into the shared output buffer.
+    # Arguments:
+        job (tuple): (job index, first sample, end sample, output buffer path, output shape, sweep buffer path, sweep shape).
+    """
+    k, begin, end, outputs_name, outputs_shape, sweep_name, sweep_shape = job
+    start = time.time()
+    inputs = _WORKER['inputs']
+    if inputs.ndim == 2:
+        feed = np.broadcast_to(inputs[None], (end - begin,) + inputs.shape)
+    else:
+        feed = inputs[begin:end]
+    if _WORKER['sweep']:
+        feed = [feed, np.array(_attach(sweep_name, sweep_shape, _WORKER['dtype'])[begin:end])]
+    result = _WORKER['model'].predict(feed, batch_size = end - begin)
+    outputs = _attach(outputs_name, outputs_shape, _WORKER['dtype'], mode = 'r+')
+    outputs[begin:end] = result
+    outputs.flush()
+    del outputs
+    return OrderedDict([('job', k), ('begin', begin), ('end', end), ('seconds', time.time() - start),
+                        ('pid', os.getpid()), ('build_seconds', _WORKER['build_seconds'])])
+
+class SweepRunner(object):
+    """Runs parameter sweeps of a circuit on a pool of worker processes that is forked once.
+    Every worker builds the circuit once and reuses it for all of its jobs. The inputs and sweep values are shared with the workers
+    through memory-mapped buffer files in a temporary directory, and the workers write their outputs into a shared output buffer, so no arrays are pickled.
+    The parent process should not have created a TensorFlow session before the runner forks its workers.
+    # Attributes:
+        n_workers (int): Number of worker processes.
+        batch_size (int): Number of samples per job.
+        output_size (int): Number of output columns of the circuit.
+        timings (list of OrderedDicts): Job index, sample range, seconds, worker pid and the build time of that worker, for every job of the last run.
+    """
+    def __init__(self, build_cell, inputs, n_workers = None, batch_size = 64, mode = 'loop', threads_per_worker = 1):
+        """Initialization function for the SweepRunner class.
+        # Arguments:
+            build_cell (function): Returns the KaulosWrapperCell to simulate, typically with a sweep; called once in every worker.
+            inputs (ndarray): Inputs of shape (timesteps, units), shared by all samples, or (n_samples, timesteps, units).
+            n_workers (int): Number of worker processes; the number of CPU cores by default.
+            batch_size (int): Number of samples per job.
+            mode (str): Simulation mode, 'loop' or 'unroll'.
+            threads_per_worker (int): Number of TensorFlow threads of every worker.
+        """
+        import multiprocessing
+        self.n_workers = multiprocessing.cpu_count() if n_workers is None else int(n_workers)
+        self.batch_size = int(batch_size)
+        self.dtype = K.floatx()
+        inputs = np.asarray(inputs, dtype=self.dtype)
+        if inputs.ndim not in (2, 3):
+            raise ValueError('The inputs need the shape (timesteps, units) or (n_samples, timesteps, units).')
+        self.inputs_shape = inputs.shape
+        self.directory = tempfile.mkdtemp(prefix='kaulos_sweep_')
+        self.inputs_path = os.path.join(self.directory, 'inputs.dat')
+        shared_inputs = _attach(self.inputs_path, self.inputs_shape, self.dtype, mode = 'w+')
+        shared_inputs[...] = inputs
+        shared_inputs.flush()
+        del shared_inputs
+        self.pool = multiprocessing.get_context('fork').Pool(self.n_workers, initializer=_init_worker,
+            initargs=(build_cell, self.inputs_path, self.inputs_shape, self.dtype, mode, threads_per_worker))
+        self.output_size = self.pool.apply(_worker_output_size)
+        self.timings = []
+    def run(self, sweep_values = None):
+        """Simulates one sample per row of sweep_values, or per input sample, and returns the outputs.
+        # Arguments:
+            sweep_values (ndarray): Per-sample params of shape (n_samples, cell.sweep_size), for cells that sweep params.
+        # Returns:
+            ndarray of shape (n_samples, timesteps, output_size).
+        """
+        if sweep_values is not None:
+            sweep_values = np.asarray(sweep_values, dtype=self.dtype)
+            n_samples = sweep_values.shape[0]
+        elif len(self.inputs_shape) == 3:
+            n_samples = self.inputs_shape[0]
+        else:
+            raise ValueError('Shared (timesteps, units) inputs need sweep_values to define the samples.')
+        if len(self.inputs_shape) == 3 and self.inputs_shape[0] != n_samples:
+            raise ValueError('The inputs have ' + str(self.inputs_shape[0]) + ' samples but the sweep has ' + str(n_samples) + '.')
+        outputs_shape = (n_samples, self.inputs_shape[-2], self.output_size)
+        outputs_path = os.path.join(self.directory, 'outputs.dat')
+        _attach(outputs_path, outputs_shape, self.dtype, mode = 'w+').flush()
+        sweep_path, sweep_shape = None, None
+        if sweep_values is not None:
+            sweep_path, sweep_shape = os.path.join(self.directory, 'sweep.dat'), sweep_values.shape
+            shared_sweep = _attach(sweep_path, sweep_shape, self.dtype, mode = 'w+')
+            shared_sweep[...] = sweep_values
+            shared_sweep.flush()
+            del shared_sweep
+        try:
+            jobs = [(k, begin, min(begin + self.batch_size, n_samples), outputs_path, outputs_shape, sweep_path, sweep_shape)
+                    for k, begin in enumerate(range(0, n_samples, self.batch_size))]
+            self.timings = sorted(self.pool.imap_unordered(_run_job, jobs), key=lambda i: i['job'])
+            outputs = np.array(_attach(outputs_path, outputs_shape, self.dtype))
+        finally:
+            for path in [outputs_path, sweep_path]:
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+        return outputs
+    def close(self):
+        """Stops the workers and removes the buffer files.
+        """
+        self.pool.close()
+        self.pool.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,70 @@
+from .compact_dependencies import *
+
+class RateTable(object):
+    """Tabulated voltage-dependent rate functions, sampled on a uniform grid and linearly interpolated at every step.
+    Voltages outside of the grid are clamped to its ends.
+    # Attributes:
+        names (list of str): Names of the tabulated rates.
+        v_min (float): First voltage of the grid.
+        step (float): Spacing of the grid.
+        grid (ndarray): Voltages of the grid.
+        values (ndarray): Rates of shape (len(grid) + 1, len(names)); the last row repeats the end of the grid.
+        error (OrderedDict of floats): Largest absolute interpolation error of every rate, measured halfway between grid points.
+    """
+    def __init__(self, rate_functions, v_min, v_max, step):
+        """Initialization function for the RateTable class.
+        # Arguments:
+            rate_functions (function): Maps an ndarray of voltages to an OrderedDict of rate arrays.
+            v_min (float): First voltage of the grid.
+            v_max (float): Last voltage of the grid.
+            step (float): Spacing of the grid.
+        """
+        if step <= 0 or v_max <= v_min:
+            raise ValueError('A rate table needs a positive step and v_max > v_min.')
+        self.v_min = float(v_min)
+        self.step = float(step)
+        self.grid = self.v_min + self.step * np.arange(int(np.ceil((v_max - v_min) / step)) + 1)
+        exact = self.evaluate(rate_functions, self.grid)
+        self.names = list(exact.keys())
+        values = np.stack([exact[a] for a in self.names], axis=-1)
+        self.values = np.concatenate([values, values[-1:]], axis=0).astype('float32')
+        # Linear interpolation is least accurate halfway between grid points
+        midpoints = self.evaluate(rate_functions, self.grid[:-1] + 0.5 * self.step)
+        self.error = OrderedDict((a, float(np.max(np.abs(0.5 * (values[:-1, k] + values[1:, k]) - midpoints[a]))))
+                                 for k, a in enumerate(self.names))
+    def evaluate(self, rate_functions, V):
+        """Evaluates the rate functions in double precision; removable singularities such as 0/0 are replaced by the limit.
+        # Arguments:
+            rate_functions (function): Maps an ndarray of voltages to an OrderedDict of rate arrays.
+            V (ndarray): Voltages.
+        """
+        V = np.asarray(V, dtype='float64')
+        delta = 1e-4 * self.step
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = rate_functions(V)
+            above = rate_functions(V + delta)
+            below = rate_functions(V - delta)
+        rates = OrderedDict()
+        for a in values:
+            value = np.broadcast_to(np.asarray(values[a], dtype='float64'), V.shape).copy()
+            bad = ~np.isfinite(value)
+            value[bad] = 0.5 * (np.broadcast_to(above[a], V.shape)[bad] + np.broadcast_to(below[a], V.shape)[bad])
+            rates[a] = value
+        return rates
+
+def interpolate_table(table, V, values = None):
+    """Looks up the rates of a RateTable by linear interpolation; a single gather per grid neighbour serves all rates.
+    # Arguments:
+        table (RateTable): The tabulated rates.
+        V (tensor): Voltages of shape (batch_size, units).
+        values (tensor): The rates of the table as a tensor created once, so that the table is not added to the graph by every call; table.values if None.
+    """
+    if values is None:
+        values = table.values
+    position = K.clip((V - table.v_min) / table.step, 0.0, float(len(table.grid) - 1))
+    index = K.cast(position, 'int32')
+    fraction = K.expand_dims(position - K.cast(index, K.floatx()))
+    lower = K.gather(values, index)
+    upper = K.gather(values, index + 1)
+    rates = lower + fraction * (upper - lower)
+    return OrderedDict((a, rates[..., k]) for k, a in enumerate(table.names))
@@ -0,0 +1,19 @@
+from kaulos import *
+from kaulos.kaulos_benchmarks import CIRCUITS, run_benchmarks
+import json
+
+def test_benchmark_report():
+    report = run_benchmarks(units = [4], timesteps = [20], repeats = 1)
+    assert len(report['results']) == len(CIRCUITS)
+    for record in report['results']:
+        assert record['steps_per_second'] > 0
+        assert record['neuron_steps_per_second'] == record['steps_per_second'] * record['component_units']
+        assert record['peak_rss_mb'] > 0
+    assert json.loads(json.dumps(report))['environment']['keras'] == keras.__version__
+
+def test_benchmarks_run_in_separate_processes():
+    # A small benchmark after a large one reports its own peak memory only when it runs in a fresh process
+    large, small = run_benchmarks(circuits = ['HodgkinHuxley'], units = [100000, 2], timesteps = [20], repeats = 1)['results']
+    assert small['peak_rss_mb'] < large['peak_rss_mb']
+    report = run_benchmarks(circuits = ['IdealIAF'], units = [4], timesteps = [20], repeats = 1, isolate = False)
+    assert report['results'][0]['peak_rss_mb'] > 0
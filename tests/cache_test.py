@@ -0,0 +1,50 @@
+from kaulos import *
+
+def test_cache_reuses_identical_circuits():
+    cache = CircuitCache()
+    x_train = np.ones((1, 50, 4)) * 10.0
+    output = cache.simulate([HodgkinHuxley(), LeakyIAF()], x_train, return_state = False)
+    circuit = cache.get([HodgkinHuxley(), LeakyIAF()], (None, 4), return_state = False)
+    assert cache.misses == 1 and cache.hits == 1 and len(cache) == 1
+    assert np.allclose(circuit.predict(x_train), output)
+    model = build_simulation(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), (None, 4), return_state = False)
+    assert np.allclose(model.predict(x_train), output, atol=1e-5)
+    # Loop mode shares one circuit across sequence lengths
+    cache.simulate([HodgkinHuxley(), LeakyIAF()], x_train[:, :20], return_state = False)
+    assert cache.misses == 1
+
+def test_cache_keys_on_configuration():
+    cache = CircuitCache()
+    a = cache.get([LeakyIAF(component_units = 3)], (None, 6))
+    assert cache.get([LeakyIAF(component_units = 3, R = 2.0)], (None, 6)) is not a
+    assert cache.get([LeakyIAF(component_units = 3, dt = 5e-4)], (None, 6)) is not a
+    assert cache.get([LeakyIAF(component_units = 3)], (None, 6), mode = 'unroll') is not a
+    assert cache.get([LeakyIAF(component_units = 3)], (20, 6), mode = 'unroll') is not a
+    assert cache.get([LeakyIAF(component_units = 4)], (None, 8)) is not a
+    assert cache.get([IdealIAF(component_units = 3)], (None, 6)) is not a
+    assert cache.misses == 7 and cache.hits == 0
+    assert cache.get([LeakyIAF(component_units = 3)], (None, 6)) is a
+
+def test_cache_keys_on_trainable_values():
+    cache = CircuitCache()
+    a = cache.get([HodgkinHuxley(params_trainable = ['g_Na'], g_Na = 100.)], (None, 2))
+    b = cache.get([HodgkinHuxley(params_trainable = ['g_Na'], g_Na = 120.)], (None, 2))
+    assert b is not a and cache.misses == 2
+    assert cache.get([HodgkinHuxley(params_trainable = ['g_Na'], g_Na = 100.)], (None, 2)) is a
+
+def test_cache_eviction_and_invalidation():
+    cache = CircuitCache(max_size = 2)
+    a = cache.get([LeakyIAF()], (None, 2))
+    b = cache.get([IdealIAF()], (None, 2))
+    cache.get([LeakyIAF()], (None, 2))
+    cache.get([HodgkinHuxley()], (None, 2))
+    assert len(cache) == 2
+    assert a.key in cache.circuits and b.key not in cache.circuits
+    assert cache.invalidate([LeakyIAF()], (None, 2)) == 1
+    assert a.key not in cache.circuits
+    assert cache.invalidate() == 1 and len(cache) == 0
+    try:
+        CircuitCache(max_size = 0)
+        assert False
+    except ValueError:
+        pass
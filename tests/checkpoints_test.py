@@ -0,0 +1,60 @@
+from kaulos import *
+import os
+
+def test_resume_matches_continuous_run(tmp_path):
+    M = 4
+    T = 100
+    x_train = np.abs(np.random.randn(2,T,M)) * 10.0
+    directory = str(tmp_path / 'checkpoint')
+
+    continuous = np.concatenate(list(StreamingSimulator(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), 20).run(x_train)), axis=1)
+    simulator = StreamingSimulator(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), 20)
+    first = np.concatenate(list(simulator.run(x_train[:, :60], checkpoint_directory = directory, checkpoint_every = 3)), axis=1)
+
+    resumed = StreamingSimulator(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), 20)
+    checkpoint = resumed.restore_checkpoint(directory)
+    assert resumed.steps == 60 and isinstance(checkpoint.states[0], np.memmap)
+    rest = np.concatenate(list(resumed.run(x_train[:, 60:])), axis=1)
+    assert np.allclose(continuous, np.concatenate([first, rest], axis=1), atol=1e-4)
+
+    cell = KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()])
+    model = build_simulation(cell, (None, M), return_state = False, initial_state = restore_checkpoint(directory, cell).initial_state())
+    assert np.allclose(model.predict(x_train[:, 60:]), rest, atol=1e-4)
+
+def test_warm_start_broadcasts_one_sample(tmp_path):
+    directory = str(tmp_path / 'checkpoint')
+    cell = KaulosWrapperCell([HodgkinHuxley()])
+    simulator = StreamingSimulator(cell, 50)
+    list(simulator.run(np.ones((1, 50, 2)) * 10.0))
+    simulator.save_checkpoint(directory)
+    checkpoint = load_checkpoint(directory)
+    states = checkpoint.initial_state(batch_size = 5)
+    assert states[0].shape == (5, checkpoint.states[0].shape[1])
+    assert np.allclose(states[0], simulator.states[0][0])
+    try:
+        Checkpoint([np.zeros((2, 3))], 0, [], OrderedDict()).initial_state(batch_size = 5)
+        assert False
+    except ValueError:
+        pass
+
+def test_restore_params_and_circuit_check(tmp_path):
+    directory = str(tmp_path / 'checkpoint')
+    cell = KaulosWrapperCell([LeakyIAF(component_units = 3, R = np.array([1.0, 2.0, 3.0]))])
+    save_checkpoint(directory, cell, [np.zeros((1, 6))], steps = 7)
+    restored = KaulosWrapperCell([LeakyIAF(component_units = 3)])
+    checkpoint = restore_checkpoint(directory, restored)
+    assert checkpoint.steps == 7
+    # Snapshots are switched by the index only once complete; older ones beyond keep are removed
+    os.makedirs(os.path.join(directory, '.tmp_step_interrupted'))
+    save_checkpoint(directory, cell, [np.ones((1, 6))], steps = 9, keep = 2)
+    save_checkpoint(directory, cell, [np.ones((1, 6)) * 2.0], steps = 11, keep = 2)
+    assert sorted(i for i in os.listdir(directory) if i.startswith('step_')) == ['step_11', 'step_9']
+    # The temporary directory of the interrupted save is cleaned up
+    assert not any(i.startswith('.tmp_step_') for i in os.listdir(directory))
+    assert load_checkpoint(directory).steps == 11 and np.allclose(load_checkpoint(directory).states[0], 2.0)
+    assert np.allclose(restored.layers[0].get_param_values()['R'], [[1.0, 2.0, 3.0]])
+    try:
+        restore_checkpoint(directory, KaulosWrapperCell([IdealIAF(component_units = 3)]))
+        assert False
+    except ValueError:
+        pass
@@ -0,0 +1,54 @@
+from kaulos import *
+
+def get_circuit():
+    components = [LeakyIAF(component_units = 3), AlphaSynapse(component_units = 3)]
+    connectivity = Connectivity(components)
+    connectivity.connect(0, 'spike', 1, 'spike', pre_units = [0, 1, 2, 2], post_units = [0, 1, 2, 0])
+    return components, connectivity
+
+def test_connectivity_columns():
+    components, connectivity = get_circuit()
+    rows, cols, weights = coo_connectivity(connectivity, connectivity.shape)
+    assert connectivity.shape == (12, 12)
+    assert list(rows) == [3, 5, 4, 5]
+    assert list(cols) == [6, 6, 7, 8]
+    assert np.allclose(connectivity.todense()[rows, cols], weights)
+
+def test_sparse_routing_matches_dense():
+    x_train = np.zeros((1,200,12))
+    x_train[:,:,:3] = 1500.0
+    outputs = []
+    for sparse in [True, False]:
+        components, connectivity = get_circuit()
+        cell = KaulosWrapperCell(components, W = connectivity, sparse = sparse)
+        outputs.append(build_simulation(cell, (None, 12)).predict(x_train)[0])
+    assert np.allclose(outputs[0], outputs[1], atol=1e-5)
+    assert np.sum(outputs[0][0,:,3:6]) > 0
+    assert np.max(outputs[0][0,:,6:9]) > 0
+
+def test_synapse_aggregator():
+    components = [HodgkinHuxley(component_units = 2), AlphaSynapse(component_units = 5)]
+    post_units = np.array([0, 1, 1, 0, 1])
+    aggregator = SynapseAggregator(components, 1, 0, post_units)
+    output = np.random.randn(3, 14).astype('float32')
+    g, reverse, V = output[:, 4:9], output[:, 9:14], output[:, 0:2]
+    expected = np.zeros((3, 2))
+    for s in range(5):
+        expected[:, post_units[s]] += g[:, s] * (V[:, post_units[s]] - reverse[:, s])
+    result = K.eval(aggregator.aggregate(K.constant(output)))
+    assert result.shape == (3, 14)
+    assert np.allclose(result[:, :2], expected, atol=1e-4)
+    assert np.allclose(result[:, 2:], 0.)
+
+def test_delays_shift_synaptic_input():
+    x_train = np.zeros((1,200,12))
+    x_train[:,:,:3] = 1500.0
+    outputs = []
+    for delay in [0, 7]:
+        components = [LeakyIAF(component_units = 3), AlphaSynapse(component_units = 3)]
+        connectivity = Connectivity(components).connect(0, 'spike', 1, 'spike', delay = delay)
+        cell = KaulosWrapperCell(components, W = connectivity)
+        outputs.append(build_simulation(cell, (200, 12), mode = 'unroll' if delay == 0 else 'loop').predict(x_train)[0])
+    assert np.allclose(outputs[0][:,:,:6], outputs[1][:,:,:6])
+    assert np.allclose(outputs[0][:,:-7,6:], outputs[1][:,7:,6:], atol=1e-5)
+    assert np.allclose(outputs[1][:,:7,6:9], 0.)
@@ -26,3 +26,48 @@ def get_model_spikes():
 
 def test_spikes():
     assert get_model_spikes() == 7.0
+
+
+def get_circuit_output(components, fuse, x_train):
+    cell = KaulosWrapperCell(components, fuse = fuse)
+    x = keras.Input(x_train.shape[1:])
+    layer = RNN(cell, return_sequences = True, unroll = True)
+    model = Model(inputs=x, outputs=layer(x))
+    return model.predict(x_train)
+
+def test_fused_components():
+    x_train = np.abs(np.random.randn(1,50,8)) * 0.1
+    components = [LeakyIAF(threshold = 0.5), AlphaSynapse(), LeakyIAF(threshold = 2.0), AlphaSynapse(gmax = 10.)]
+    fused_output = get_circuit_output(components, True, x_train)
+    unfused_output = get_circuit_output(components, False, x_train)
+    assert np.allclose(fused_output, unfused_output, atol=1e-5)
+
+def test_derived_params_follow_trainable_params():
+    component = LeakyIAF(component_units = 2, params_trainable = ['C'], C = 2.0, dt = 1e-3)
+    cell = KaulosWrapperCell([component])
+    cell.build((None, cell.units))
+    assert np.allclose(K.eval(component.lpu_attributes.derived['dt_over_C']), 1e-3 / 2.0)
+    component.set_param_values({'C': 4.0})
+    assert np.allclose(K.eval(component.lpu_attributes.derived['dt_over_C']), 1e-3 / 4.0)
+    assert np.allclose(K.eval(component.lpu_attributes.derived['leak']), 1.0 / 4.0)
+
+def test_packed_params():
+    component = HodgkinHuxley(component_units = 4, params_trainable = ['g_Na'], g_K = np.arange(4.) + 30., h = 0.5)
+    assert len(component.weights) == 2
+    assert [w for w in component.trainable_weights] == [component.packed_weights['params_trainable'][0]]
+    values = component.get_param_values()
+    assert np.allclose(values['g_K'], np.arange(4.) + 30.) and np.allclose(values['g_Na'], 120.)
+    assert np.allclose(component.lpu_attributes.inters['h'], 0.5)
+    component.set_param_values({'g_Na': np.arange(4.), 'g_l': 1.0})
+    values = component.get_param_values()
+    assert np.allclose(values['g_Na'], np.arange(4.)) and np.allclose(values['g_l'], 1.0) and np.allclose(values['g_K'], np.arange(4.) + 30.)
+
+def test_fused_param_values_are_forwarded():
+    components = [LeakyIAF(threshold = 0.5), AlphaSynapse(), LeakyIAF(component_units = 2, threshold = 2.0)]
+    cell = KaulosWrapperCell(components)
+    assert cell.fused and cell.component_slices[2] == (0, 1, 3)
+    assert np.allclose(cell.get_param_values(2)['threshold'], 2.0)
+    cell.set_param_values(2, {'threshold': np.array([3.0, 4.0])})
+    assert np.allclose(K.get_value(cell.layers[0].packed_weights['params'][0])[0], [0.5, 3.0, 4.0])
+    assert np.allclose(components[2].get_param_values()['threshold'], [3.0, 4.0])
+    assert np.allclose(cell.get_param_values(0)['threshold'], 0.5)
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+# Time that importing kaulos may add on top of importing keras itself, in seconds
+IMPORT_BUDGET = 1.0
+# Modules that importing kaulos must not load; keras may already load some of them, e.g. h5py, so only the modules kaulos adds are checked
+LAZY_MODULES = ['sklearn', 'pandas', 'scipy.stats', 'h5py']
+
+IMPORT_BENCHMARK = '''
+import sys, time
+start = time.time()
+import keras
+middle = time.time()
+loaded = set(sys.modules)
+import kaulos
+end = time.time()
+print(end - middle)
+print(','.join(m for m in %r if m in sys.modules and m not in loaded))
+''' % (LAZY_MODULES,)
+
+def get_import_benchmark():
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_BENCHMARK]).decode().strip().splitlines()
+    return float(output[-2]), [m for m in output[-1].split(',') if m]
+
+def test_import_time():
+    import_time, loaded_modules = get_import_benchmark()
+    assert loaded_modules == []
+    assert import_time < IMPORT_BUDGET
@@ -0,0 +1,94 @@
+from kaulos import *
+from kaulos.kaulos_engine import _KaulosModel
+
+def relax(integrator, dt, steps, linear = True):
+    step = rebind_step(integrator)
+    A, B = 2.0, 50.0
+    derivatives = lambda x: OrderedDict([('x', (A, B) if linear else A - B * x['x'])])
+    x = OrderedDict([('x', np.zeros((1, 1)))])
+    for t in range(steps):
+        x = step(derivatives, x, dt)
+    exact = A / B * (1.0 - np.exp(-B * dt * steps))
+    return np.abs(x['x'] - exact).max()
+
+def test_exponential_euler_is_exact_for_linear_derivatives():
+    assert relax(exponential_euler, 0.1, 10) < 1e-10
+    # Plain derivatives fall back to forward Euler, which is unstable for B dt > 2
+    assert relax(exponential_euler, 0.1, 10, linear = False) > 1.0
+
+def test_rk4_is_more_accurate_than_euler():
+    assert relax(runge_kutta4, 0.005, 10) < 1e-3 * relax(forward_euler, 0.005, 10)
+
+def test_unknown_integrator():
+    try:
+        HodgkinHuxley(integrator = 'midpoint')
+        assert False
+    except ValueError:
+        pass
+
+def test_hodgkin_huxley_integrators_converge():
+    M, T = 4, 200
+    x_train = np.ones((1, T, M)) * 10.0
+    outputs = {}
+    for integrator in [None, 'euler', 'rk4', 'exponential_euler']:
+        outputs[integrator] = NumpyKaulosEngine([HodgkinHuxley(integrator = integrator), AlphaSynapse()]).simulate(x_train)
+        assert np.all(np.isfinite(outputs[integrator]))
+    V = lambda integrator: outputs[integrator][0, :, 0]
+    assert np.allclose(V('rk4'), V('euler'), atol=1e-2)
+    assert np.allclose(V('exponential_euler'), V('rk4'), atol=1e-2)
+
+def test_expm_rotation():
+    theta = np.array([0.3, 2.0, 40.0])
+    M = np.zeros((3, 2, 2))
+    M[:, 0, 1], M[:, 1, 0] = -theta, theta
+    E = expm(M)
+    assert np.allclose(E[:, 0, 0], np.cos(theta)) and np.allclose(E[:, 1, 0], np.sin(theta))
+
+def test_exact_leaky_iaf_subthreshold():
+    dt, T = 0.1, 50
+    engine = NumpyKaulosEngine([LeakyIAF(integrator = 'exact', dt = dt, R = 1.0, C = 1.0)])
+    V = engine.simulate(np.ones((1, T, 1)) * 0.5)[0, :, 0]
+    t = dt * np.arange(1, T + 1)
+    assert np.allclose(V, 0.5 * (1.0 - np.exp(-t)), atol=1e-5)
+
+def test_exact_alpha_synapse_at_large_dt():
+    dt, T, a = 0.05, 60, 2.0
+    x = np.zeros((1, T, 2))
+    x[0, 0, 0] = 1.0
+    engine = NumpyKaulosEngine([AlphaSynapse(integrator = 'exact', dt = dt, ar = a, ad = a)])
+    g = engine.simulate(x)[0, :, 0] / 100.
+    t = dt * np.arange(T)
+    assert np.allclose(g, a * a * t * np.exp(-a * t), atol=1e-5)
+
+def test_exact_needs_linear_model():
+    try:
+        HodgkinHuxley(integrator = 'exact')
+        assert False
+    except ValueError:
+        pass
+
+def test_exact_propagator_follows_set_param_values():
+    dt, T = 0.1, 30
+    x_train = np.ones((1, T, 4)) * 0.5
+    component = LeakyIAF(component_units = 2, integrator = 'exact', dt = dt, threshold = 10.)
+    model = build_simulation(KaulosWrapperCell([component]), (None, 4), return_state = False)
+    model.predict(x_train)
+    component.set_param_values({'R': [2.0, 3.0]})
+    reference = build_simulation(KaulosWrapperCell([LeakyIAF(component_units = 2, integrator = 'exact', dt = dt, threshold = 10., R = np.array([2.0, 3.0]))]),
+                                 (None, 4), return_state = False)
+    assert np.allclose(model.predict(x_train), reference.predict(x_train), atol=1e-5)
+
+def test_integrator_needs_derivatives():
+    class Leak(_KaulosModel):
+        params = OrderedDict([('tau', 1.0)])
+        alters = OrderedDict([('V', 0.0)])
+        inters = OrderedDict([])
+        accesses = ['I']
+        integrators = ('rk4',)
+        def kaulos_step(self):
+            self.integrate(['V'])
+    try:
+        KaulosWrapperCell([Leak(integrator = 'rk4')]).build((None, 1))
+        assert False
+    except ValueError as e:
+        assert 'derivatives' in str(e)
@@ -0,0 +1,28 @@
+from kaulos import *
+
+def keras_and_numpy_outputs(components, M, T):
+    x_train = np.abs(np.random.randn(1,T,M)) * 0.1
+
+    cell = KaulosWrapperCell(components)
+    x = keras.Input(x_train.shape[1:])
+    layer = RNN(cell, return_sequences = True, unroll = True)
+    y = layer(x)
+    model = Model(inputs=x, outputs=y)
+
+    engine = NumpyKaulosEngine(components)
+    return model.predict(x_train), engine.simulate(x_train)
+
+def test_numpy_engine_leaky_iaf():
+    keras_output, numpy_output = keras_and_numpy_outputs([LeakyIAF()], 2, 100)
+    assert keras_output.shape == numpy_output.shape
+    assert np.allclose(keras_output, numpy_output, atol=1e-5)
+
+def test_numpy_engine_hodgkin_huxley():
+    keras_output, numpy_output = keras_and_numpy_outputs([HodgkinHuxley(), AlphaSynapse()], 4, 100)
+    assert keras_output.shape == numpy_output.shape
+    assert np.allclose(keras_output, numpy_output, atol=1e-3)
+
+def test_numpy_engine_integrators():
+    for integrator in ['rk4', 'exponential_euler']:
+        keras_output, numpy_output = keras_and_numpy_outputs([HodgkinHuxley(integrator = integrator), AlphaSynapse()], 4, 100)
+        assert np.allclose(keras_output, numpy_output, atol=1e-3)
@@ -0,0 +1,30 @@
+from kaulos import *
+
+def build_model(profiler, T = 20):
+    components = [HodgkinHuxley(component_units = 3), AlphaSynapse(component_units = 3)]
+    cell = KaulosWrapperCell(components, W = Connectivity(components).connect(0, 'spike', 1, 'spike'), profiler = profiler)
+    return build_simulation(cell, (T, cell.units), return_state = False)
+
+def count_model_ops(profiler):
+    K.clear_session()
+    before = len(tf.get_default_graph().get_operations())
+    build_model(profiler)
+    return len(tf.get_default_graph().get_operations()) - before
+
+def test_profiler_report():
+    K.clear_session()
+    profiler = KaulosProfiler()
+    model = build_model(profiler)
+    x_train = np.ones((1, 20, 9)) * 10.0
+    outputs = profiler.profile(model, x_train)[0]
+    assert np.allclose(outputs, model.predict(x_train), atol=1e-5)
+    report = profiler.report()
+    phases = set((i['component'], i['phase']) for i in report)
+    for phase in ['acquire', 'step', 'distribute']:
+        assert ('0_HodgkinHuxley', phase) in phases and ('1_AlphaSynapse', phase) in phases
+    assert ('cell', 'route') in phases
+    step = [i for i in report if i['component'] == '0_HodgkinHuxley' and i['phase'] == 'step'][0]
+    assert step['ops'] > 0 and step['calls'] > 0 and step['seconds'] > 0
+
+def test_profiler_does_not_change_the_graph():
+    assert count_model_ops(None) == count_model_ops(KaulosProfiler())
@@ -0,0 +1,53 @@
+from kaulos import *
+import h5py
+
+def test_recorder_decimation(tmp_path):
+    M = 4
+    T = 100
+    x_train = np.abs(np.random.randn(1,T,M)) * 10.0
+
+    cell = KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()])
+    simulator = StreamingSimulator(cell, 30)
+    outputs = []
+    file_name = str(tmp_path / 'recording')
+    with HDF5Recorder(file_name, cell, probes = ['spike', 'V'], decimation = 3, compression = 'gzip') as recorder:
+        for output in simulator.run(x_train):
+            recorder.record(output)
+            outputs.append(output)
+    outputs = np.concatenate(outputs, axis=1)
+
+    h5f = h5py.File(file_name + '.h5', 'r')
+    assert np.allclose(h5f['spike'][:], outputs[:, ::3, :][:, :, [1, 3]])
+    assert np.allclose(h5f['V'][:], outputs[:, ::3, :][:, :, [0, 2]])
+    h5f.close()
+
+def test_spike_events_match_dense_spikes():
+    M = 4
+    T = 200
+    x_train = np.abs(np.random.randn(2,T,M)) * 10.0
+
+    cell = KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()])
+    dense_output = np.concatenate(list(simulate_stream(cell, x_train, 50)), axis=1)
+    chunks = list(simulate_stream(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), x_train, 50, event_variable = 'spike'))
+    events = SpikeEvents.concatenate([i[1] for i in chunks])
+    rest_output = np.concatenate([i[0] for i in chunks], axis=1)
+
+    spikes = dense_output[:, :, [1, 3]] > 0.5
+    assert events.n_steps == T
+    assert np.array_equal(events.to_dense() > 0.5, spikes)
+    assert np.allclose(rest_output, dense_output[:, :, [0, 2]], atol=1e-4)
+    assert np.array_equal(events.counts(T).sum(axis=0), spikes[0].sum(axis=0))
+
+def test_spike_events_keep_substep_counts():
+    M = 2
+    T = 100
+    x_train = np.abs(np.random.randn(1,T,M)) * 50.0
+
+    cell = KaulosWrapperCell([LeakyIAF()], substeps = 4, substep_reduce = 'sum')
+    dense_output = np.concatenate(list(simulate_stream(cell, x_train, 50)), axis=1)
+    chunks = list(simulate_stream(KaulosWrapperCell([LeakyIAF()], substeps = 4, substep_reduce = 'sum'), x_train, 50, event_variable = 'spike'))
+    events = SpikeEvents.concatenate([i[1] for i in chunks])
+
+    spikes = dense_output[:, :, cell.variable_index('spike')]
+    assert np.allclose(events.to_dense(), spikes)
+    assert np.allclose(events.counts(T).sum(axis=0), spikes[0].sum(axis=0))
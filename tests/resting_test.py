@@ -0,0 +1,38 @@
+from kaulos import *
+import os
+
+def test_leaky_iaf_rests_at_input_times_resistance(tmp_path):
+    cache = RestingStateCache(str(tmp_path))
+    state = cache.get(LeakyIAF, {'R': 2.0, 'threshold': 10.0, 'dt': 1e-2}, accesses = {'I': 0.5}, integrator = 'exact')
+    assert np.isclose(state['V'], 1.0, atol=1e-4) and state['spike'] == 0.0
+    assert len(os.listdir(str(tmp_path))) == 1
+    # A new cache reads the persisted state instead of relaxing again
+    reloaded = RestingStateCache(str(tmp_path), max_steps = 0)
+    assert reloaded.get(LeakyIAF, {'R': 2.0, 'threshold': 10.0, 'dt': 1e-2}, accesses = {'I': 0.5}, integrator = 'exact') == state
+
+def test_hodgkin_huxley_warm_start():
+    cache = RestingStateCache()
+    components = [HodgkinHuxley(dt = 1e-2), HodgkinHuxley(component_units = 3, dt = 1e-2, g_l = np.array([0.3, 0.3, 0.4]))]
+    cell = KaulosWrapperCell(components)
+    initial_state = cache.initial_state(cell, batch_size = 2)
+    assert [i.shape for i in initial_state] == [(2, 8), (2, 20)]
+    # Equal param sets share one entry
+    assert len(cache.states) == 2
+    rest = cache.get(HodgkinHuxley, {'dt': 1e-2})
+    assert np.isclose(rest['h'], initial_state[1][0, 2]) and np.isclose(rest['V'], initial_state[0][0, 0])
+    outputs = NumpyKaulosEngine(components).simulate(np.zeros((2, 200, cell.units)), initial_state = initial_state)
+    assert np.allclose(outputs, initial_state[0][:, None, :], atol=1e-3)
+
+def test_relaxation_gives_up():
+    try:
+        relax_resting_state(IdealIAF, [{'threshold': 1.0, 'C': 1.0, 'dt': 1e-3}], accesses = {'I': 10.0}, max_steps = 2000)
+        assert False
+    except ValueError:
+        pass
+
+def test_relaxations_reuse_engines():
+    cache = RestingStateCache()
+    low = cache.get(LeakyIAF, {'R': 2.0, 'threshold': 10.0, 'dt': 1e-2}, accesses = {'I': 0.5}, integrator = 'exact')
+    high = cache.get(LeakyIAF, {'R': 4.0, 'threshold': 10.0, 'dt': 1e-2}, accesses = {'I': 0.5}, integrator = 'exact')
+    assert len(cache.engines) == 1
+    assert np.isclose(low['V'], 1.0, atol=1e-4) and np.isclose(high['V'], 2.0, atol=1e-4)
@@ -0,0 +1,94 @@
+from kaulos import *
+
+def test_loop_matches_unroll():
+    M = 4
+    T = 100
+    x_train = np.abs(np.random.randn(2,T,M)) * 10.0
+
+    looped = build_simulation(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), (None, M), mode = 'loop')
+    unrolled = build_simulation(KaulosWrapperCell([HodgkinHuxley(), LeakyIAF()]), (T, M), mode = 'unroll')
+    looped_output = looped.predict(x_train)
+    unrolled_output = unrolled.predict(x_train)
+    assert len(looped_output) == 3
+    for a, b in zip(looped_output, unrolled_output):
+        assert a.shape == b.shape
+        assert np.allclose(a, b, atol=1e-4)
+    assert np.allclose(looped_output[0][:,-1,:], looped_output[1])
+
+def test_stream_matches_single_run():
+    M = 2
+    T = 100
+    x_train = np.abs(np.random.randn(1,T,M)) * 10.0
+
+    model = build_simulation(KaulosWrapperCell([HodgkinHuxley()]), (None, M))
+    single_output = model.predict(x_train)[0]
+    simulator = StreamingSimulator(KaulosWrapperCell([HodgkinHuxley()]), 30)
+    stream_output = np.concatenate(list(simulator.run(x_train)), axis=1)
+    assert simulator.steps == T
+    assert np.allclose(single_output, stream_output, atol=1e-4)
+
+def test_stimuli_match_materialized_inputs():
+    M = 4
+    T = 200
+    dt = 1e-3
+    time = np.arange(T) * dt
+    x_train = np.zeros((1,T,M))
+    x_train[0,:,0] = 40. * (time >= 0.0505) * (time < 0.1205)
+    x_train[0,:,2] = 10. * np.sin(2.0 * np.pi * 20. * time)
+
+    cell = KaulosWrapperCell([HodgkinHuxley(), HodgkinHuxley()])
+    index = cell.access_index('I')
+    stimuli = [StepStimulus(index[0], 40., 0.0505, 0.1205), SinusoidStimulus(index[1], 10., 20.)]
+    driven = build_simulation(KaulosWrapperCell([HodgkinHuxley(), HodgkinHuxley()], stimuli = stimuli), (M,), timesteps = T)
+    reference = build_simulation(cell, (None, M))
+    driven_output = driven.predict(np.zeros((1,M)))
+    reference_output = reference.predict(x_train)
+    assert np.allclose(driven_output[0], reference_output[0], atol=1e-2)
+    assert np.allclose(driven_output[-1], T)
+
+def test_poisson_stimulus_is_reproducible_per_step():
+    T = 50
+    def spikes(seed, mode):
+        cell = KaulosWrapperCell([Integrator(component_units = 20, dt = 1.0)], stimuli = [PoissonStimulus(np.arange(20), 0.3, seed = seed)])
+        V = build_simulation(cell, (cell.units,), mode = mode, timesteps = T).predict(np.zeros((2, cell.units)))[0]
+        return np.diff(np.concatenate([np.zeros((2, 1, 20)), V], axis=1), axis=1)
+    looped = spikes(1, 'loop')
+    assert np.allclose(looped, spikes(1, 'unroll')) and np.allclose(looped, spikes(1, 'loop'))
+    assert not np.allclose(looped, spikes(2, 'loop'))
+    # Every step draws new numbers
+    assert len(set(tuple(i) for i in looped[0])) > 1 and 0.1 < looped.mean() < 0.5
+
+def test_counter_stays_exact_in_long_runs():
+    cell = KaulosWrapperCell([LeakyIAF()], stimuli = [StepStimulus(0, 1., 0., 1e9)])
+    start = 2 ** 24 + 1
+    simulator = StreamingSimulator(cell, 10, initial_state = [np.zeros((1, 2)), np.array([[start]])])
+    list(simulator.run(np.zeros((1, 10, cell.units))))
+    assert simulator.states[-1].dtype == np.int32 and simulator.states[-1][0, 0] == start + 10
+
+def test_substeps_match_fine_steps():
+    M = 2
+    T = 50
+    k = 4
+    x_train = np.abs(np.random.randn(1,T,M)) * 10.0
+
+    fine = build_simulation(KaulosWrapperCell([HodgkinHuxley()]), (None, M))
+    coarse = build_simulation(KaulosWrapperCell([HodgkinHuxley()], substeps = k), (None, M))
+    fine_output = fine.predict(np.repeat(x_train, k, axis=1))[0]
+    coarse_output = coarse.predict(x_train)[0]
+    assert coarse_output.shape == (1, T, 2)
+    assert np.allclose(coarse_output, fine_output[:, k-1::k, :], atol=1e-4)
+
+def test_parameter_sweep():
+    T = 60
+    thresholds = np.array([0.5, 1.0, 2.0])
+    conductances = np.array([20.0, 36.0, 50.0])
+    x_train = np.zeros((3, T, 4))
+    x_train[:, :, 0] = 1000.0
+    x_train[:, :, 2] = 10.0
+    cell = KaulosWrapperCell([LeakyIAF(), HodgkinHuxley()], sweep = [(0, 'threshold'), (1, 'g_K')])
+    assert cell.sweep_size == 2 and list(cell.sweep_columns(1, 'g_K')) == [1]
+    model = build_simulation(cell, (T, 4), return_state = False)
+    outputs = model.predict([x_train, np.stack([thresholds, conductances], axis=-1)])
+    for k in range(3):
+        engine = NumpyKaulosEngine([LeakyIAF(threshold = thresholds[k]), HodgkinHuxley(g_K = conductances[k])])
+        assert np.allclose(outputs[k], engine.simulate(x_train[k:k+1])[0], atol=1e-3)
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+SWEEP_SCRIPT = '''
+from kaulos import *
+
+def build_cell():
+    return KaulosWrapperCell([LeakyIAF()], sweep = [(0, 'threshold')])
+
+inputs = np.zeros((40, 2))
+inputs[:, 0] = 1000.0
+thresholds = np.linspace(0.5, 2.0, 10)[:, None]
+with SweepRunner(build_cell, inputs, n_workers = 2, batch_size = 3) as runner:
+    outputs = runner.run(thresholds)
+    timings = runner.timings
+error = 0.0
+for k in range(len(thresholds)):
+    reference = NumpyKaulosEngine([LeakyIAF(threshold = thresholds[k, 0])]).simulate(inputs[None])[0]
+    error = max(error, np.abs(outputs[k] - reference).max())
+print(error)
+print(len(timings), sum(i['end'] - i['begin'] for i in timings), len(set(i['pid'] for i in timings)) <= 2)
+'''
+
+def test_sweep_runner():
+    output = subprocess.check_output([sys.executable, '-c', SWEEP_SCRIPT]).decode().strip().splitlines()
+    assert float(output[-2]) < 1e-4
+    assert output[-1] == '4 10 True'
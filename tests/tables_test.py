@@ -0,0 +1,32 @@
+from kaulos import *
+
+def test_rate_table_error_bound():
+    coarse = NumpyKaulosEngine([HodgkinHuxley(rate_table_step = 0.5)]).layers[0].rate_table
+    fine = NumpyKaulosEngine([HodgkinHuxley(rate_table_step = 0.05)]).layers[0].rate_table
+    assert list(fine.names) == ['a_n', 'a_m', 'a_h', 'b_n', 'b_m', 'b_h']
+    assert np.all(np.isfinite(fine.values))
+    # Linear interpolation error shrinks with the square of the step
+    for a in fine.names:
+        assert fine.error[a] <= coarse.error[a] / 50.
+    assert max(fine.error.values()) < 5e-3
+
+def test_tabulated_hodgkin_huxley_matches_analytic():
+    x_train = np.ones((1, 300, 2)) * 10.0
+    analytic = NumpyKaulosEngine([HodgkinHuxley()]).simulate(x_train)
+    tabulated = NumpyKaulosEngine([HodgkinHuxley(rate_table_step = 0.05)]).simulate(x_train)
+    assert np.allclose(analytic[0, :, 0], tabulated[0, :, 0], atol=1e-3)
+
+def test_tabulated_hodgkin_huxley_keras():
+    x_train = np.ones((1, 100, 2)) * 10.0
+    components = [HodgkinHuxley(integrator = 'exponential_euler', rate_table_step = 0.1)]
+    x = keras.Input(x_train.shape[1:])
+    model = Model(inputs=x, outputs=RNN(KaulosWrapperCell(components), return_sequences = True)(x))
+    numpy_output = NumpyKaulosEngine(components).simulate(x_train)
+    assert np.allclose(model.predict(x_train), numpy_output, atol=1e-4)
+
+def test_rate_table_needs_rate_functions():
+    try:
+        LeakyIAF(rate_table_step = 0.1)
+        assert False
+    except ValueError:
+        pass